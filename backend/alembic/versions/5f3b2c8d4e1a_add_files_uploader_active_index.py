@@ -0,0 +1,27 @@
+"""add_files_uploader_active_index
+
+Revision ID: 5f3b2c8d4e1a
+Revises: a1e86dcb086f
+Create Date: 2026-10-15 10:00:00.000000
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '5f3b2c8d4e1a'
+down_revision = 'a1e86dcb086f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Partial index for listing a user's live files, newest first
+    op.create_index('ix_files_uploader_active', 'files',
+                    ['uploader_id', 'created_at'],
+                    postgresql_where=sa.text('deleted_at IS NULL'),
+                    sqlite_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_files_uploader_active', table_name='files')
@@ -7,8 +7,9 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Request
 from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, EmailStr
-import requests
+import httpx
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -25,9 +26,19 @@ from backend.app.services.google_drive import (
 )
 from backend.core.config import settings
 
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+
+# Shared outbound HTTP client (connection pooling across requests)
+_http_client = httpx.AsyncClient(timeout=10.0, follow_redirects=True)
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+async def close_http_client() -> None:
+    """Closes the shared outbound HTTP client and its connection pool (app shutdown)."""
+    await _http_client.aclose()
+
+
 def _ensure_aware(dt: Optional[datetime]) -> Optional[datetime]:
     """Ensures that datetime has UTC timezone."""
     if dt is None:
@@ -136,9 +147,8 @@ async def oauth_callback(
         
         # Get user information from Google via direct API request
         # This bypasses the credentials.expiry timezone issue
-        import requests
-        userinfo_response = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
+        userinfo_response = await _http_client.get(
+            GOOGLE_USERINFO_URL,
             headers={"Authorization": f"Bearer {tokens['access_token']}"}
         )
         userinfo_response.raise_for_status()
@@ -452,33 +462,33 @@ async def get_avatar(current_user: User = Depends(get_current_user)):
     
     try:
         # Load image from Google servers
-        response = requests.get(
+        upstream_request = _http_client.build_request(
+            "GET",
             current_user.avatar_url,
-            stream=True,
-            timeout=10,
             headers={
                 "User-Agent": "Mozilla/5.0 (compatible; DataRoom/1.0)"
             }
         )
-        response.raise_for_status()
+        response = await _http_client.send(upstream_request, stream=True)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await response.aclose()
+            raise
         
         # Determine content-type from Google response
         content_type = response.headers.get("Content-Type", "image/jpeg")
         
-        # Return image as stream
-        def generate():
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    yield chunk
-        
+        # Return image as stream; the upstream response is closed afterwards
         return StreamingResponse(
-            generate(),
+            response.aiter_bytes(),
             media_type=content_type,
             headers={
                 "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-            }
+            },
+            background=BackgroundTask(response.aclose),
         )
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Failed to fetch avatar: {str(e)}"
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import mimetypes
 import uuid
 from typing import Any, Dict, List, Optional
@@ -9,22 +10,28 @@ from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
 from backend.app.db import get_session
 from backend.app.deps import get_current_user
 from backend.app.models import File, User
-from backend.app.services.file_storage import save_imported_file, get_file_path, delete_file
+from backend.app.services.file_storage import (
+    save_imported_stream,
+    get_file_path,
+    delete_file,
+)
 from backend.app.services.google_drive import (
+    DriveAPIError,
     create_credentials_from_tokens,
-    download_drive_file,
-    get_file_metadata,
+    get_files_metadata,
+    iter_drive_file,
     list_drive_files,
-    refresh_access_token,
+    get_fresh_credentials,
     upload_file_to_drive,
     check_drive_upload_permission,
     create_drive_folder,
 )
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 
 router = APIRouter(prefix="/files", tags=["files"])
@@ -99,24 +106,39 @@ def _normalize_extension(name: Optional[str], mime_type: Optional[str]) -> Optio
     return None
 
 
+# Any drive.google.com URL is kept as-is (file/, drive/, open?id=...)
+_VALID_WEB_VIEW_PREFIXES = ("https://drive.google.com/",)
+_drive_view_link = "https://drive.google.com/file/d/{}/view".format
+
+# Upper bound on Drive downloads running at once during an import
+_IMPORT_CONCURRENCY = 8
+
+
 def _get_valid_web_view_link(web_view_link: Optional[str], drive_file_id: Optional[str]) -> Optional[str]:
     """
     Validates and returns a valid Google Drive web view link.
     If the provided link is invalid or None, generates one from drive_file_id.
     """
-    # Validate existing link
-    if web_view_link:
-        # Check if it's a valid Google Drive link
-        if web_view_link.startswith("https://drive.google.com/"):
-            return web_view_link
-        # If it's not a valid Drive link (e.g., aistudio.google.com), ignore it
-        # and generate a new one
-    
-    # Generate link from drive_file_id if available
-    if drive_file_id:
-        return f"https://drive.google.com/file/d/{drive_file_id}/view"
-    
-    return None
+    # Links from other hosts (e.g. aistudio.google.com) are replaced
+    if web_view_link and web_view_link.startswith(_VALID_WEB_VIEW_PREFIXES):
+        return web_view_link
+    return _drive_view_link(drive_file_id) if drive_file_id else None
+
+
+# Columns read by _serialize_file; listings load only these
+_SERIALIZED_COLUMNS = (
+    File.id,
+    File.original_name,
+    File.mime_type,
+    File.extension,
+    File.size_bytes,
+    File.status,
+    File.drive_file_id,
+    File.storage_key,
+    File.created_at,
+    File.updated_at,
+    File.scan_report,
+)
 
 
 def _serialize_file(file_obj: File) -> Dict[str, Any]:
@@ -149,87 +171,36 @@ async def _refresh_and_save_user_tokens(
     user: User,
     session: AsyncSession,
 ) -> None:
-    """Refreshes user tokens if expired and saves to database."""
-    from google.oauth2.credentials import Credentials as GoogleCredentials
+    """
+    Refreshes the user's Google access token if it is close to expiry and saves it.
+    
+    Goes through the shared single-flight refresh, so concurrent requests for one
+    user cause one refresh. A token refreshed in the background
+    (stale-while-revalidate) is returned by the next call and saved then.
+    """
+    if not (user.google_access_token and user.google_refresh_token):
+        return
     
-    # Create credentials
     credentials = create_credentials_from_tokens(
         user.google_access_token,
         user.google_refresh_token,
         user.google_token_expires_at,
     )
+    try:
+        credentials = await get_fresh_credentials(credentials)
+    except Exception as e:
+        # If token refresh failed, log and continue with current token
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.warning(f"Failed to refresh token for user {user.id}: {e}")
+        return
     
-    # CRITICAL: ALWAYS create new Credentials with guaranteed correct expiry
-    # before any valid/expired check to avoid timezone issues
-    fixed_expiry = None
-    if credentials.expiry:
-        if credentials.expiry.tzinfo is None:
-            fixed_expiry = credentials.expiry.replace(tzinfo=timezone.utc)
-        else:
-            fixed_expiry = credentials.expiry.astimezone(timezone.utc)
-    else:
-        # If expiry is missing, set default value
-        fixed_expiry = datetime.now(timezone.utc) + timedelta(seconds=3600)
-    
-    # Create new credentials with correct expiry
-    credentials = GoogleCredentials(
-        token=credentials.token,
-        refresh_token=credentials.refresh_token,
-        token_uri=credentials.token_uri,
-        client_id=credentials.client_id,
-        client_secret=credentials.client_secret,
-        scopes=credentials.scopes,
-        expiry=fixed_expiry,
-    )
-    
-    # Check if token needs refresh using direct expiry check
-    # instead of credentials.valid/expired to avoid timezone issues
-    needs_refresh = False
-    if credentials.token and credentials.refresh_token:
-        if fixed_expiry:
-            # Check if token expired (with 60 second buffer)
-            now_utc = datetime.now(timezone.utc)
-            if fixed_expiry <= now_utc + timedelta(seconds=60):
-                needs_refresh = True
-        else:
-            # If expiry is missing, consider token expired
-            needs_refresh = True
-    
-    if needs_refresh:
-        old_token = credentials.token
-        try:
-            credentials = refresh_access_token(credentials)
-            
-            # Ensure refreshed expiry has timezone
-            refreshed_expiry = credentials.expiry
-            if refreshed_expiry:
-                if refreshed_expiry.tzinfo is None:
-                    refreshed_expiry = refreshed_expiry.replace(tzinfo=timezone.utc)
-                else:
-                    refreshed_expiry = refreshed_expiry.astimezone(timezone.utc)
-                
-                # Create new credentials with correct expiry
-                credentials = GoogleCredentials(
-                    token=credentials.token,
-                    refresh_token=credentials.refresh_token,
-                    token_uri=credentials.token_uri,
-                    client_id=credentials.client_id,
-                    client_secret=credentials.client_secret,
-                    scopes=credentials.scopes,
-                    expiry=refreshed_expiry,
-                )
-            
-            # If token changed, save to database
-            if credentials.token != old_token and refreshed_expiry:
-                user.google_access_token = credentials.token
-                user.google_token_expires_at = refreshed_expiry
-                await session.commit()
-                await session.refresh(user)
-        except Exception as e:
-            # If token refresh failed, log and continue with current token
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Failed to refresh token for user {user.id}: {e}")
+    # If token changed, save to database
+    if credentials.token != user.google_access_token and credentials.expiry:
+        user.google_access_token = credentials.token
+        user.google_token_expires_at = credentials.expiry
+        await session.commit()
+        await session.refresh(user)
 
 
 @router.get("", response_model=List[FileOut])
@@ -239,6 +210,7 @@ async def list_imported_files(
 ):
     result = await session.execute(
         select(File)
+        .options(load_only(*_SERIALIZED_COLUMNS))
         .where(File.uploader_id == current_user.id, File.deleted_at.is_(None))
         .order_by(File.created_at.desc())
     )
@@ -319,7 +291,7 @@ async def upload_file_to_drive_endpoint(
         current_user.google_refresh_token,
         current_user.google_token_expires_at,
     )
-    credentials = refresh_access_token(credentials)
+    credentials = await get_fresh_credentials(credentials)
     
     if not check_drive_upload_permission(credentials):
         raise HTTPException(
@@ -354,21 +326,23 @@ async def upload_file_to_drive_endpoint(
         )
     except Exception as e:
         error_msg = str(e)
-        if "401" in error_msg or "unauthorized" in error_msg.lower():
+        status_code = getattr(e, "status_code", None)
+        # Drive reports a full account as 403 too, so check the error reason first
+        if isinstance(e, DriveAPIError) and e.quota_exceeded:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Google Drive storage quota exceeded",
+            )
+        elif status_code == 401 or "unauthorized" in error_msg.lower():
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Google Drive authorization error. Please try logging in again",
             )
-        elif "403" in error_msg or "forbidden" in error_msg.lower() or "insufficient permission" in error_msg.lower():
+        elif status_code == 403 or "forbidden" in error_msg.lower() or "insufficient permission" in error_msg.lower():
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No permission to upload files to Google Drive. Please sign in again with Google to grant upload permissions.",
             )
-        elif "quota" in error_msg.lower() or "storage" in error_msg.lower():
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Google Drive storage quota exceeded",
-            )
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -417,7 +391,7 @@ async def check_drive_permissions(
         current_user.google_refresh_token,
         current_user.google_token_expires_at,
     )
-    credentials = refresh_access_token(credentials)
+    credentials = await get_fresh_credentials(credentials)
     
     user_scopes = credentials.scopes or []
     
@@ -455,7 +429,7 @@ async def create_drive_folder_endpoint(
         current_user.google_refresh_token,
         current_user.google_token_expires_at,
     )
-    credentials = refresh_access_token(credentials)
+    credentials = await get_fresh_credentials(credentials)
     
     if not check_drive_upload_permission(credentials):
         raise HTTPException(
@@ -482,17 +456,18 @@ async def create_drive_folder_endpoint(
         )
     except Exception as e:
         error_msg = str(e)
-        if "401" in error_msg or "unauthorized" in error_msg.lower():
+        status_code = getattr(e, "status_code", None)
+        if status_code == 401 or "unauthorized" in error_msg.lower():
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Google Drive authorization error. Please try logging in again",
             )
-        elif "403" in error_msg or "forbidden" in error_msg.lower():
+        elif status_code == 403 or "forbidden" in error_msg.lower():
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No permission to create folders in Google Drive",
             )
-        elif "404" in error_msg or "not found" in error_msg.lower():
+        elif status_code == 404 or "not found" in error_msg.lower():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Parent folder not found",
@@ -534,92 +509,84 @@ async def import_files(
     skipped: List[ImportSkippedItem] = []
     failed: List[ImportFailureItem] = []
 
-    for drive_file_id in payload.file_ids:
-        # Check if file already exists (only non-deleted files)
-        exists_result = await session.execute(
-            select(File).where(
-                File.drive_file_id == drive_file_id,
-                File.deleted_at.is_(None)
-            )
-        )
-        existing_file = exists_result.scalar_one_or_none()
-        if existing_file:
-            # File already imported and not deleted - skip it
-            file_name = existing_file.original_name if existing_file else None
-            skipped.append(ImportSkippedItem(
-                file_id=drive_file_id, 
-                reason="already_imported",
-                file_name=file_name
-            ))
-            continue
-        
-        # Check if file was previously deleted (soft-deleted)
-        deleted_result = await session.execute(
-            select(File).where(
-                File.drive_file_id == drive_file_id,
-                File.deleted_at.isnot(None)
-            )
-        )
-        deleted_file = deleted_result.scalar_one_or_none()
-        if deleted_file:
+    # Look up all requested ids at once (active and soft-deleted records)
+    file_ids = list(dict.fromkeys(payload.file_ids))
+    existing_result = await session.execute(
+        select(File).where(File.drive_file_id.in_(file_ids))
+    )
+    active_files: Dict[str, File] = {}
+    for existing_file in existing_result.scalars():
+        if existing_file.deleted_at is None:
+            active_files[existing_file.drive_file_id] = existing_file
+        else:
             # File was deleted - allow re-import by removing old record
-            # This allows re-importing deleted files
-            await session.delete(deleted_file)
-            await session.flush()  # Flush to ensure deletion happens before new insert
-            # Continue to import process below
+            await session.delete(existing_file)
+    await session.flush()  # Flush to ensure deletions happen before new inserts
 
+    to_fetch = [drive_file_id for drive_file_id in file_ids if drive_file_id not in active_files]
+    # One batched metadata lookup instead of a round trip per file
+    try:
+        metadata_by_id = await get_files_metadata(
+            current_user.google_access_token,
+            current_user.google_refresh_token,
+            current_user.google_token_expires_at,
+            to_fetch,
+        ) if to_fetch else {}
+    except Exception as exc:
+        # Token refresh, transport or whole-batch failure: every file fails, as a per-file lookup would
+        metadata_by_id = dict.fromkeys(to_fetch, exc)
+    download_slots = asyncio.Semaphore(_IMPORT_CONCURRENCY)
+
+    async def _fetch_drive_file(drive_file_id: str):
+        """Downloads and stores one Drive file; returns a File or a skip/failure item."""
         try:
-            metadata = await get_file_metadata(
-                current_user.google_access_token,
-                current_user.google_refresh_token,
-                current_user.google_token_expires_at,
-                drive_file_id,
-            )
+            metadata = metadata_by_id.get(drive_file_id)
+            if isinstance(metadata, Exception):
+                raise metadata
+            if metadata is None:
+                raise DriveAPIError("File not found in Google Drive", 404)
 
             mime_type = metadata.get("mimeType")
             original_name = metadata.get("name") or "untitled"
             
             # Skip folders (can't import folders)
             if mime_type == "application/vnd.google-apps.folder":
-                skipped.append(ImportSkippedItem(
+                return ImportSkippedItem(
                     file_id=drive_file_id, 
                     reason="unsupported_type",
                     file_name=original_name
-                ))
-                continue
+                )
             # Skip Google Apps files (Docs, Sheets, etc.) and Google AI Studio prompts
             if mime_type and (
                 mime_type.startswith("application/vnd.google-apps.") or
                 mime_type.startswith("application/vnd.google-makersuite.")
             ):
-                skipped.append(ImportSkippedItem(
+                return ImportSkippedItem(
                     file_id=drive_file_id, 
                     reason="unsupported_type",
                     file_name=original_name
-                ))
-                continue
+                )
             extension = _normalize_extension(original_name, mime_type)
 
-            file_bytes = await download_drive_file(
-                current_user.google_access_token,
-                current_user.google_refresh_token,
-                current_user.google_token_expires_at,
-                drive_file_id,
-            )
-
-            if not file_bytes:
-                failed.append(ImportFailureItem(file_id=drive_file_id, error="empty_file"))
-                continue
-
+            # Stream the download straight into storage instead of buffering it
             file_uuid = uuid.uuid4()
-            storage_key, checksum = save_imported_file(
-                current_user.id,
-                file_uuid,
-                extension,
-                file_bytes,
-            )
+            async with download_slots:
+                storage_key, checksum, size_bytes = await save_imported_stream(
+                    current_user.id,
+                    file_uuid,
+                    extension,
+                    iter_drive_file(
+                        current_user.google_access_token,
+                        current_user.google_refresh_token,
+                        current_user.google_token_expires_at,
+                        drive_file_id,
+                    ),
+                )
+
+            if not size_bytes:
+                delete_file(storage_key)
+                return ImportFailureItem(file_id=drive_file_id, error="empty_file")
 
-            size_bytes = len(file_bytes)
             try:
                 size_from_meta_value = metadata.get("size")
                 size_from_meta = int(size_from_meta_value) if size_from_meta_value is not None else None
@@ -631,7 +598,7 @@ async def import_files(
             raw_web_view_link = metadata.get("webViewLink")
             valid_web_view_link = _get_valid_web_view_link(raw_web_view_link, drive_file_id)
             
-            new_file = File(
+            return File(
                 id=file_uuid,
                 uploader_id=current_user.id,
                 storage_key=storage_key,
@@ -649,45 +616,48 @@ async def import_files(
                     "owners": metadata.get("owners"),
                 },
             )
-            session.add(new_file)
-            imported_files.append(new_file)
 
         except HTTPException:
             raise
         except Exception as exc:
-            # Handle IntegrityError (duplicate drive_file_id) as already_imported
-            from sqlalchemy.exc import IntegrityError
-            if isinstance(exc, IntegrityError) and "files_drive_file_id_key" in str(exc):
-                # Try to get file name from metadata if available
-                file_name = None
-                try:
-                    metadata = await get_file_metadata(
-                        current_user.google_access_token,
-                        current_user.google_refresh_token,
-                        current_user.google_token_expires_at,
-                        drive_file_id,
-                    )
-                    file_name = metadata.get("name")
-                except:
-                    pass
-                skipped.append(ImportSkippedItem(
-                    file_id=drive_file_id, 
-                    reason="already_imported",
-                    file_name=file_name
-                ))
-                continue
-            
             # Improve error messages
             error_msg = str(exc)
-            if "404" in error_msg or "not found" in error_msg.lower():
+            status_code = getattr(exc, "status_code", None)
+            # Drive reports quota errors as 403 too, so check the error reason first
+            if isinstance(exc, DriveAPIError) and exc.quota_exceeded:
+                error_msg = "Google Drive storage quota exceeded"
+            elif status_code == 404 or "not found" in error_msg.lower():
                 error_msg = "File not found in Google Drive"
-            elif "403" in error_msg or "forbidden" in error_msg.lower() or "permission" in error_msg.lower():
+            elif status_code == 403 or "forbidden" in error_msg.lower() or "permission" in error_msg.lower():
                 error_msg = "No access to file in Google Drive"
-            elif "401" in error_msg or "unauthorized" in error_msg.lower():
+            elif status_code == 401 or "unauthorized" in error_msg.lower():
                 error_msg = "Google Drive authorization error. Please try logging in again"
-            elif "quota" in error_msg.lower() or "storage" in error_msg.lower():
-                error_msg = "Google Drive storage quota exceeded"
-            failed.append(ImportFailureItem(file_id=drive_file_id, error=error_msg))
+            return ImportFailureItem(file_id=drive_file_id, error=error_msg)
+
+    # Drive downloads run concurrently; the session is only used below
+    fetched = dict(zip(to_fetch, await asyncio.gather(*(_fetch_drive_file(f) for f in to_fetch))))
+
+    for drive_file_id in payload.file_ids:
+        existing_file = active_files.get(drive_file_id)
+        if existing_file is not None:
+            # File already imported and not deleted - skip it
+            skipped.append(ImportSkippedItem(
+                file_id=drive_file_id, 
+                reason="already_imported",
+                file_name=existing_file.original_name
+            ))
+            continue
+
+        result = fetched[drive_file_id]
+        if isinstance(result, File):
+            session.add(result)
+            imported_files.append(result)
+            # A repeated id in the same request is reported as already imported
+            active_files[drive_file_id] = result
+        elif isinstance(result, ImportSkippedItem):
+            skipped.append(result)
+        else:
+            failed.append(result)
 
     if imported_files:
         try:
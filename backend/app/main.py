@@ -1,15 +1,28 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 
+from backend.api.auth import close_http_client
 from backend.api.routers import router
+from backend.app.services.google_drive import DriveAPIError
 from backend.core.config import settings
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Releases shared outbound connections on shutdown (and on reload)."""
+    yield
+    await close_http_client()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # --- CORS ---
@@ -31,6 +44,20 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.exception_handler(DriveAPIError)
+async def drive_api_error_handler(request: Request, exc: DriveAPIError):
+    """Maps uncaught Google Drive failures to 401 (re-login) or 502."""
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"detail": "Google Drive authorization error. Please try logging in again"},
+        )
+    return JSONResponse(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        content={"detail": str(exc)},
+    )
+
+
 # --- Routers ---
 app.include_router(router, prefix="/api")
 
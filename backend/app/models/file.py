@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from typing import Optional
 
-from sqlalchemy import BigInteger, Boolean, CheckConstraint, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Boolean, CheckConstraint, ForeignKey, Index, Integer, String, text
 from sqlalchemy.dialects.postgresql import UUID, ENUM, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -42,6 +42,14 @@ class File(Base, TimestampMixin, SoftDeleteMixin):
     __table_args__ = (
         CheckConstraint("size_bytes > 0", name="ck_files_size_positive"),
         CheckConstraint("version >= 1", name="ck_files_version_positive"),
+        # Serves the "my files" listing: uploader filter + created_at ordering, live rows only
+        Index(
+            "ix_files_uploader_active",
+            "uploader_id",
+            "created_at",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
     )
 
 
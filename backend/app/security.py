@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import base64
 import hmac
-import json
 import time
-from hashlib import sha256
+from hashlib import blake2b
 from typing import Any, Dict, Optional
 
 import bcrypt
+import orjson
 
 from backend.core.config import settings
 
+# Session token signature length in bytes
+_SIGNATURE_SIZE = 32
+_BLAKE2B_MAX_KEY = 64
+
 
 def _b64encode(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).decode("utf-8").rstrip("=")
@@ -18,19 +22,28 @@ def _b64encode(data: bytes) -> str:
 
 def _b64decode(data: str) -> bytes:
     padding = "=" * (-len(data) % 4)
-    return base64.urlsafe_b64decode(data + padding)
+    # validate=True: reject stray characters instead of silently dropping them
+    return base64.b64decode(data + padding, altchars=b"-_", validate=True)
+
+
+def _mac(payload_b64: str) -> bytes:
+    # Keyed BLAKE2b: one pass instead of HMAC's two; keys over 64 bytes are hashed down like HMAC does
+    key = settings.SECRET_KEY.encode("utf-8")
+    if len(key) > _BLAKE2B_MAX_KEY:
+        key = blake2b(key).digest()
+    return blake2b(payload_b64.encode("utf-8"), key=key, digest_size=_SIGNATURE_SIZE).digest()
 
 
 def _sign(payload_b64: str) -> str:
-    mac = hmac.new(settings.SECRET_KEY.encode("utf-8"), payload_b64.encode("utf-8"), sha256).digest()
-    return _b64encode(mac)
+    return _b64encode(_mac(payload_b64))
 
 
 def create_session_token(user_id: str, ttl_minutes: int | None = None) -> str:
     ttl = ttl_minutes if ttl_minutes is not None else settings.SESSION_TTL_MINUTES
     exp = int(time.time()) + ttl * 60
     payload: Dict[str, Any] = {"sub": user_id, "exp": exp}
-    payload_b64 = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    # orjson emits compact UTF-8 bytes directly (no whitespace, no str -> bytes copy)
+    payload_b64 = _b64encode(orjson.dumps(payload))
     sig = _sign(payload_b64)
     return f"{payload_b64}.{sig}"
 
@@ -40,11 +53,15 @@ def verify_session_token(token: str) -> Optional[Dict[str, Any]]:
         payload_b64, sig = token.split(".", 1)
     except ValueError:
         return None
-    expected_sig = _sign(payload_b64)
-    if not hmac.compare_digest(sig, expected_sig):
+    # Compare raw digests: decode the signature once rather than re-encoding ours
+    try:
+        sig_bytes = _b64decode(sig)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(sig_bytes, _mac(payload_b64)):
         return None
     try:
-        payload = json.loads(_b64decode(payload_b64))
+        payload = orjson.loads(_b64decode(payload_b64))
     except Exception:
         return None
     if not isinstance(payload, dict):
@@ -72,7 +89,7 @@ def hash_password(password: str) -> str:
         password_bytes = password_bytes[:72]
     
     # Generate salt and hash password
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -1,52 +1,94 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import hashlib
 import uuid
 from pathlib import Path
-from typing import Tuple
+from typing import AsyncIterator, BinaryIO, Callable, Tuple
 
 from backend.core.config import settings
 
 
-def _ensure_storage_root() -> Path:
-    root = Path(settings.STORAGE_PATH)
+@functools.lru_cache(maxsize=1024)
+def _ensure_dir(directory: Path) -> None:
+    # Cached per directory (bounded), so repeated writes skip the mkdir call
+    directory.mkdir(parents=True, exist_ok=True)
+
+
+def _open_for_write(file_path: Path) -> BinaryIO:
+    _ensure_dir(file_path.parent)
+    try:
+        return open(file_path, "wb")
+    except FileNotFoundError:
+        # Directory was removed after it was cached; recreate it once
+        _ensure_dir.cache_clear()
+        _ensure_dir(file_path.parent)
+        return open(file_path, "wb")
+
+
+@functools.lru_cache(maxsize=8)
+def _storage_root(storage_path: str) -> Path:
+    root = Path(storage_path)
     root.mkdir(parents=True, exist_ok=True)
     return root
 
 
-def save_imported_file(
+def _ensure_storage_root() -> Path:
+    # Keyed on the current setting so runtime overrides still take effect
+    return _storage_root(settings.STORAGE_PATH)
+
+
+def _storage_key(user_id: uuid.UUID, file_id: uuid.UUID, extension: str | None) -> str:
+    ext = ""
+    if extension:
+        ext = extension if extension.startswith(".") else f".{extension.lstrip('.')}"
+    return f"users/{user_id}/{file_id}{ext}"
+
+
+def _write_chunk(writer: BinaryIO, update_hash: Callable[[bytes], None], chunk: bytes) -> None:
+    writer.write(chunk)
+    update_hash(chunk)
+
+
+async def save_imported_stream(
     user_id: uuid.UUID,
     file_id: uuid.UUID,
     extension: str | None,
-    content: bytes,
-) -> Tuple[str, str]:
+    chunks: AsyncIterator[bytes],
+) -> Tuple[str, str, int]:
     """
-    Persists imported file content on disk and returns storage metadata.
+    Persists imported file content chunk by chunk, hashing as it goes, so only
+    one chunk is held in memory at a time. Partial content is removed if the
+    stream fails.
 
     Args:
         user_id: Owner of the file.
         file_id: Internal file UUID.
         extension: File extension (with or without leading dot) or None.
-        content: Raw file bytes.
+        chunks: Async iterator of raw file bytes.
 
     Returns:
-        Tuple of (storage_key, sha256_checksum).
+        Tuple of (storage_key, sha256_checksum, size_bytes).
     """
-    root = _ensure_storage_root()
-    user_dir = root / "users" / str(user_id)
-    user_dir.mkdir(parents=True, exist_ok=True)
+    storage_key = _storage_key(user_id, file_id, extension)
+    hasher = hashlib.sha256()
+    size = 0
 
-    ext = ""
-    if extension:
-        ext = extension if extension.startswith(".") else f".{extension.lstrip('.')}"
-
-    file_name = f"{file_id}{ext}"
-    file_path = user_dir / file_name
-    file_path.write_bytes(content)
+    file_path = get_file_path(storage_key)
+    writer = _open_for_write(file_path)
+    try:
+        async for chunk in chunks:
+            # Disk write and hashing run off the loop so concurrent imports overlap
+            await asyncio.to_thread(_write_chunk, writer, hasher.update, chunk)
+            size += len(chunk)
+    except BaseException:
+        writer.close()
+        file_path.unlink(missing_ok=True)
+        raise
+    writer.close()
 
-    checksum = hashlib.sha256(content).hexdigest()
-    storage_key = file_path.relative_to(root).as_posix()
-    return storage_key, checksum
+    return storage_key, hasher.hexdigest(), size
 
 
 def get_file_path(storage_key: str) -> Path:
@@ -97,4 +139,3 @@ def delete_file(storage_key: str) -> None:
     if not file_path.exists():
         raise FileNotFoundError(f"File not found: {storage_key}")
     file_path.unlink()
-
@@ -1,18 +1,96 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import io
+import threading
 import time
+import orjson
 import requests
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
 
 from backend.core.config import settings
 
+# Credentials attributes carried over when rebuilding with a normalized expiry
+_CRED_FIELDS = ("token", "refresh_token", "token_uri", "client_id", "client_secret", "scopes")
+
+# Access tokens with less lifetime than this left are refreshed before use
+TOKEN_REFRESH_SKEW = timedelta(minutes=5)
+
+# Below this lifetime callers wait for the refresh; above it (up to TOKEN_REFRESH_SKEW)
+# the current token is used while the refresh runs in the background
+_MIN_TOKEN_LIFETIME = timedelta(minutes=1)
+
+# Token-refresh transports, one per thread: a requests.Session isn't thread-safe and
+# refreshes for different users run in parallel to_thread workers. Each worker reuses
+# its session, so the connection pool stays warm instead of a TLS handshake per refresh
+_refresh_transport = threading.local()
+
+# Bytes requested per Drive media download call
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# OAuth client config; settings are read once at import
+_CLIENT_CONFIG = {
+    "web": {
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "auth_uri": settings.GOOGLE_AUTH_URI,
+        "token_uri": settings.GOOGLE_TOKEN_URI,
+        "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
+    }
+}
+
+# Partial-response field mask for Drive file listings
+_DEFAULT_FIELDS = "nextPageToken, files(id, name, mimeType, size, modifiedTime, webViewLink)"
+
+# Partial-response field mask for single-file metadata lookups
+_METADATA_FIELDS = "id, name, mimeType, size, modifiedTime, createdTime, webViewLink, owners"
+
+# Drive rejects batch requests with more than 100 calls
+_BATCH_LIMIT = 100
+
+_AUTH_URL_KWARGS = {
+    "access_type": "offline",
+    "include_granted_scopes": "true",
+    "prompt": "consent",  # Force refresh_token request
+}
+
+
+# Drive error reasons (errors[].reason in the response body) for an account out of storage
+_STORAGE_QUOTA_REASONS = frozenset({"storageQuotaExceeded", "quotaExceeded"})
+
+
+class DriveAPIError(Exception):
+    """Google Drive API call failed; the original HttpError is the __cause__."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, reason: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Machine-readable reason from Google's error body, e.g. "storageQuotaExceeded"
+        self.reason = reason
+
+    @property
+    def quota_exceeded(self) -> bool:
+        return self.reason in _STORAGE_QUOTA_REASONS
+
+
+def _drive_error(message: str, error: HttpError) -> DriveAPIError:
+    """Wraps an HttpError, keeping its status code, error reason and message text."""
+    details = getattr(error, "error_details", None)
+    reasons = [d.get("reason") for d in details if isinstance(d, dict)] if isinstance(details, list) else []
+    reason = next((r for r in reasons if r), None)
+    return DriveAPIError(f"{message}: {error.status_code} {error.reason}", error.status_code, reason)
+
+
 # === FIX GOOGLE NAIVE TZ BUG ===
 _original_expired = Credentials.expired.fget
 
@@ -29,6 +107,11 @@ Credentials.expired = property(_fixed_expired)
 # === END FIX ===
 
 
+def _rebuild_with_expiry(credentials: Credentials, expiry: datetime) -> Credentials:
+    """Returns a copy of credentials with the given expiry."""
+    return Credentials(**{k: getattr(credentials, k) for k in _CRED_FIELDS}, expiry=expiry)
+
+
 def _ensure_aware(dt: Optional[datetime]) -> Optional[datetime]:
     """Ensures that datetime has UTC timezone."""
     if dt is None:
@@ -45,31 +128,30 @@ def _ensure_aware(dt: Optional[datetime]) -> Optional[datetime]:
 def create_oauth_flow() -> Flow:
     """Creates OAuth 2.0 flow for Google."""
     flow = Flow.from_client_config(
-        {
-            "web": {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "auth_uri": settings.GOOGLE_AUTH_URI,
-                "token_uri": settings.GOOGLE_TOKEN_URI,
-                "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
-            }
-        },
+        _CLIENT_CONFIG,
         scopes=settings.GOOGLE_SCOPES,
         redirect_uri=settings.GOOGLE_REDIRECT_URI,  # Explicitly specify redirect_uri for Flow
     )
     return flow
 
 
+@functools.lru_cache(maxsize=1)
+def _authorization_flow() -> Flow:
+    """
+    Flow reused for building authorization URLs only. Token exchange keeps using a
+    fresh create_oauth_flow(), since fetch_token stores the user's tokens on the flow.
+    """
+    return create_oauth_flow()
+
+
 def get_authorization_url(state: Optional[str] = None) -> str:
     """Generates URL for Google OAuth authorization."""
-    flow = create_oauth_flow()
+    flow = _authorization_flow()
+    # authorization_url only generates a PKCE verifier when none is set; clear the
+    # previous one so each URL gets its own, as with a fresh Flow
+    flow.code_verifier = None
     # redirect_uri is already set in create_oauth_flow(), don't pass it again
-    authorization_url, _ = flow.authorization_url(
-        access_type="offline",
-        include_granted_scopes="true",
-        prompt="consent",  # Force refresh_token request
-        state=state,
-    )
+    authorization_url, _ = flow.authorization_url(**_AUTH_URL_KWARGS, state=state)
     return authorization_url
 
 
@@ -112,7 +194,7 @@ async def exchange_code_for_tokens(code: str) -> tuple:
                 },
             )
             token_response.raise_for_status()
-            token_data = token_response.json()
+            token_data = orjson.loads(token_response.content)
             
             # Create credentials from received tokens
             expires_at = (
@@ -150,52 +232,20 @@ async def exchange_code_for_tokens(code: str) -> tuple:
         if credentials.expiry.tzinfo is None:
             # Create new Credentials with correct expiry
             fixed_expiry = credentials.expiry.replace(tzinfo=timezone.utc)
-            credentials = Credentials(
-                token=credentials.token,
-                refresh_token=credentials.refresh_token,
-                token_uri=credentials.token_uri,
-                client_id=credentials.client_id,
-                client_secret=credentials.client_secret,
-                scopes=credentials.scopes,
-                expiry=fixed_expiry,
-            )
+            credentials = _rebuild_with_expiry(credentials, fixed_expiry)
         elif credentials.expiry.tzinfo != timezone.utc:
             fixed_expiry = credentials.expiry.astimezone(timezone.utc)
-            credentials = Credentials(
-                token=credentials.token,
-                refresh_token=credentials.refresh_token,
-                token_uri=credentials.token_uri,
-                client_id=credentials.client_id,
-                client_secret=credentials.client_secret,
-                scopes=credentials.scopes,
-                expiry=fixed_expiry,
-            )
+            credentials = _rebuild_with_expiry(credentials, fixed_expiry)
     
     # Final check: ensure expiry in credentials has UTC timezone
     if credentials.expiry:
         if credentials.expiry.tzinfo is None or credentials.expiry.tzinfo != timezone.utc:
             fixed_expiry = credentials.expiry.replace(tzinfo=timezone.utc) if credentials.expiry.tzinfo is None else credentials.expiry.astimezone(timezone.utc)
-            credentials = Credentials(
-                token=credentials.token,
-                refresh_token=credentials.refresh_token,
-                token_uri=credentials.token_uri,
-                client_id=credentials.client_id,
-                client_secret=credentials.client_secret,
-                scopes=credentials.scopes,
-                expiry=fixed_expiry,
-            )
+            credentials = _rebuild_with_expiry(credentials, fixed_expiry)
     elif not credentials.expiry:
         # If expiry is not set, set default value
         default_expiry = datetime.now(timezone.utc) + timedelta(seconds=3600)
-        credentials = Credentials(
-            token=credentials.token,
-            refresh_token=credentials.refresh_token,
-            token_uri=credentials.token_uri,
-            client_id=credentials.client_id,
-            client_secret=credentials.client_secret,
-            scopes=credentials.scopes,
-            expiry=default_expiry,
-        )
+        credentials = _rebuild_with_expiry(credentials, default_expiry)
     
     # Calculate expires_at for return
     expires_at = credentials.expiry
@@ -235,26 +285,108 @@ def create_credentials_from_tokens(
     return _force_credentials_utc(creds)
 
 
+def _refresh_request() -> Request:
+    """This thread's google-auth transport for token refreshes."""
+    request = getattr(_refresh_transport, "request", None)
+    if request is None:
+        request = _refresh_transport.request = Request()
+    return request
+
+
 def refresh_access_token(credentials: Credentials) -> Credentials:
     credentials = _force_credentials_utc(credentials)
 
     exp = credentials.expiry
     now = datetime.now(timezone.utc)
 
-    needs_refresh = (exp is None) or (exp <= now + timedelta(seconds=60))
+    needs_refresh = (exp is None) or (exp - now <= TOKEN_REFRESH_SKEW)
 
     if not needs_refresh:
         return credentials
 
-    credentials.refresh(Request())
+    credentials.refresh(_refresh_request())
 
     # Google writes naive datetime again after refresh → fix it
     return _force_credentials_utc(credentials)
 
 
+# In-flight refreshes and their results, keyed by refresh token, so concurrent
+# callers holding the same expiring token share one round trip to Google
+_refresh_tasks: Dict[str, asyncio.Task] = {}
+_refreshed_credentials: Dict[str, Credentials] = {}
+
+
+def _store_refreshed(key: str, task: asyncio.Task) -> None:
+    _refresh_tasks.pop(key, None)
+    # Retrieving the exception also keeps unawaited background failures quiet
+    if task.cancelled() or task.exception() is not None:
+        return
+    now = datetime.now(timezone.utc)
+    for stale_key in [k for k, c in _refreshed_credentials.items() if c.expiry is None or c.expiry <= now]:
+        del _refreshed_credentials[stale_key]
+    refreshed = task.result()
+    # Without an expiry a cached result can't be compared or aged out, so don't keep it
+    if refreshed.expiry is not None:
+        _refreshed_credentials[key] = refreshed
+
+
+async def get_fresh_credentials(credentials: Credentials) -> Credentials:
+    """
+    Returns usable credentials, refreshing at most once per refresh token at a time.
+    
+    Tokens expiring within TOKEN_REFRESH_SKEW are refreshed in the background while
+    the current token is still returned; callers only wait once less than
+    _MIN_TOKEN_LIFETIME remains.
+    """
+    key = credentials.refresh_token
+    if not key:
+        return await asyncio.to_thread(refresh_access_token, credentials)
+    
+    cached = _refreshed_credentials.get(key)
+    if cached is not None and cached.expiry is not None and (
+        credentials.expiry is None or cached.expiry > credentials.expiry
+    ):
+        credentials = cached
+    
+    remaining = credentials.expiry - datetime.now(timezone.utc) if credentials.expiry else timedelta(0)
+    if remaining > TOKEN_REFRESH_SKEW:
+        return credentials
+    
+    task = _refresh_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(refresh_access_token, credentials))
+        task.add_done_callback(functools.partial(_store_refreshed, key))
+        _refresh_tasks[key] = task
+    
+    if remaining > _MIN_TOKEN_LIFETIME:
+        return credentials
+    # shield: a cancelled caller must not cancel the refresh other callers share
+    return await asyncio.shield(task)
+
+
+@functools.lru_cache(maxsize=1)
+def _drive_discovery_doc() -> Dict[str, Any]:
+    """Drive v3 discovery document bundled with googleapiclient, parsed once."""
+    return orjson.loads(discovery_cache.get_static_doc("drive", "v3"))
+
+
 def get_drive_service(credentials: Credentials):
     """Creates Google Drive API service."""
-    return build("drive", "v3", credentials=credentials)
+    # Services are not cached: each owns an httplib2 transport, which isn't thread-safe,
+    # and requests execute in worker threads. Only the parsed discovery document is shared
+    # (build_from_document's in-place fix-ups of it are idempotent).
+    return build_from_document(_drive_discovery_doc(), credentials=credentials)
+
+
+async def _authorized_service(
+    access_token: str,
+    refresh_token: Optional[str],
+    expires_at: Optional[datetime],
+):
+    """Builds a Drive service from stored tokens, refreshing them first if needed."""
+    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
+    credentials = await get_fresh_credentials(credentials)
+    return get_drive_service(credentials)
 
 
 def check_drive_upload_permission(credentials: Credentials) -> bool:
@@ -282,6 +414,20 @@ def check_drive_upload_permission(credentials: Credentials) -> bool:
     return False
 
 
+@functools.lru_cache(maxsize=128)
+def _compose_query(parent_folder_id: Optional[str], query: Optional[str]) -> str:
+    """Builds the Drive `q` filter; repeated folder/query pairs hit the cache."""
+    q = "trashed=false"  # Only non-deleted files
+    if parent_folder_id and parent_folder_id != "root":
+        q = f"{q} and '{parent_folder_id}' in parents"
+    else:
+        # For root folder, show files that have 'root' in parents
+        q = f"{q} and 'root' in parents"
+    if query:
+        q = f"{q} and {query}"
+    return q
+
+
 async def list_drive_files(
     access_token: str,
     refresh_token: Optional[str],
@@ -306,76 +452,93 @@ async def list_drive_files(
     Returns:
         Dictionary with files and next_page_token
     """
-    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
-    credentials = refresh_access_token(credentials)
+    service = await _authorized_service(access_token, refresh_token, expires_at)
     
     try:
-        service = get_drive_service(credentials)
         
         # Query parameters
         params = {
             "pageSize": page_size,
-            "fields": "nextPageToken, files(id, name, mimeType, size, modifiedTime, webViewLink)",
-            "q": "trashed=false",  # Only non-deleted files
+            "fields": _DEFAULT_FIELDS,
+            "q": _compose_query(parent_folder_id, query),
         }
         
-        # Add parent folder filter if specified
-        if parent_folder_id and parent_folder_id != "root":
-            params["q"] = f"{params['q']} and '{parent_folder_id}' in parents"
-        else:
-            # For root folder, show files that have 'root' in parents
-            params["q"] = f"{params['q']} and 'root' in parents"
-        
-        if query:
-            params["q"] = f"{params['q']} and {query}"
-        
         if page_token:
             params["pageToken"] = page_token
         
-        results = service.files().list(**params).execute()
+        results = await asyncio.to_thread(service.files().list(**params).execute)
         
         return {
             "files": results.get("files", []),
             "next_page_token": results.get("nextPageToken"),
         }
     except HttpError as e:
-        raise Exception(f"Google Drive API error: {e}")
+        raise _drive_error("Google Drive API error", e) from e
 
 
-async def download_drive_file(
+async def iter_drive_file(
     access_token: str,
     refresh_token: Optional[str],
     expires_at: Optional[datetime],
     file_id: str,
-) -> bytes:
+    chunk_size: int = _DOWNLOAD_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
     """
-    Downloads file from Google Drive.
+    Streams file content from Google Drive in chunks.
     
     Args:
         access_token: Google access token
         refresh_token: Google refresh token
         expires_at: Access token expiration time
         file_id: File ID in Google Drive
+        chunk_size: Maximum number of bytes fetched per request
     
-    Returns:
-        File content as bytes
+    Yields:
+        Consecutive chunks of file content
     """
-    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
-    credentials = refresh_access_token(credentials)
+    service = await _authorized_service(access_token, refresh_token, expires_at)
     
     try:
-        service = get_drive_service(credentials)
-        
-        # Get file metadata
-        file_metadata = service.files().get(fileId=file_id).execute()
-        
-        # Download file
         request = service.files().get_media(fileId=file_id)
-        file_content = request.execute()
         
-        return file_content
+        # Reuse one buffer so only a single chunk is held in memory at a time
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+        done = False
+        while not done:
+            _, done = await asyncio.to_thread(downloader.next_chunk)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
     except HttpError as e:
-        raise Exception(f"Error downloading file from Google Drive: {e}")
+        raise _drive_error("Error downloading file from Google Drive", e) from e
+
+
+async def download_drive_file(
+    access_token: str,
+    refresh_token: Optional[str],
+    expires_at: Optional[datetime],
+    file_id: str,
+) -> bytes:
+    """
+    Downloads file from Google Drive.
+    
+    Args:
+        access_token: Google access token
+        refresh_token: Google refresh token
+        expires_at: Access token expiration time
+        file_id: File ID in Google Drive
+    
+    Returns:
+        File content as bytes
+    """
+    chunks = [
+        chunk
+        async for chunk in iter_drive_file(access_token, refresh_token, expires_at, file_id)
+    ]
+    return b"".join(chunks)
 
 
 async def get_file_metadata(
@@ -396,19 +559,57 @@ async def get_file_metadata(
     Returns:
         File metadata
     """
-    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
-    credentials = refresh_access_token(credentials)
+    service = await _authorized_service(access_token, refresh_token, expires_at)
     
     try:
-        service = get_drive_service(credentials)
-        file_metadata = service.files().get(
-            fileId=file_id,
-            fields="id, name, mimeType, size, modifiedTime, createdTime, webViewLink, owners",
-        ).execute()
+        request = service.files().get(fileId=file_id, fields=_METADATA_FIELDS)
+        file_metadata = await asyncio.to_thread(request.execute)
         
         return file_metadata
     except HttpError as e:
-        raise Exception(f"Error getting file metadata from Google Drive: {e}")
+        raise _drive_error("Error getting file metadata from Google Drive", e) from e
+
+
+async def get_files_metadata(
+    access_token: str,
+    refresh_token: Optional[str],
+    expires_at: Optional[datetime],
+    file_ids: List[str],
+) -> Dict[str, Any]:
+    """
+    Gets metadata for several files from Google Drive using batch requests.
+    
+    Args:
+        access_token: Google access token
+        refresh_token: Google refresh token
+        expires_at: Access token expiration time
+        file_ids: Unique file IDs in Google Drive
+    
+    Returns:
+        Mapping of file ID to its metadata, or to a DriveAPIError if that lookup failed
+    """
+    service = await _authorized_service(access_token, refresh_token, expires_at)
+    
+    results: Dict[str, Any] = {}
+    
+    def _collect(request_id: str, response: Dict[str, Any], exception: Optional[HttpError]) -> None:
+        if exception is None:
+            results[request_id] = response
+            return
+        error = _drive_error("Error getting file metadata from Google Drive", exception)
+        error.__cause__ = exception
+        results[request_id] = error
+    
+    try:
+        for start in range(0, len(file_ids), _BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=_collect)
+            for file_id in file_ids[start:start + _BATCH_LIMIT]:
+                batch.add(service.files().get(fileId=file_id, fields=_METADATA_FIELDS), request_id=file_id)
+            await asyncio.to_thread(batch.execute)
+    except HttpError as e:
+        raise _drive_error("Error getting file metadata from Google Drive", e) from e
+    
+    return results
 
 
 async def upload_file_to_drive(
@@ -435,11 +636,9 @@ async def upload_file_to_drive(
     Returns:
         Dictionary with file metadata (id, name, mimeType, etc.)
     """
-    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
-    credentials = refresh_access_token(credentials)
+    service = await _authorized_service(access_token, refresh_token, expires_at)
     
     try:
-        service = get_drive_service(credentials)
         
         # Prepare file metadata
         file_metadata = {
@@ -462,15 +661,16 @@ async def upload_file_to_drive(
             resumable=True
         )
         
-        file = service.files().create(
+        request = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, name, mimeType, size, modifiedTime, createdTime, webViewLink'
-        ).execute()
+        )
+        file = await asyncio.to_thread(request.execute)
         
         return file
     except HttpError as e:
-        raise Exception(f"Error uploading file to Google Drive: {e}")
+        raise _drive_error("Error uploading file to Google Drive", e) from e
 
 
 async def create_drive_folder(
@@ -493,11 +693,9 @@ async def create_drive_folder(
     Returns:
         Dictionary with folder metadata (id, name, mimeType, etc.)
     """
-    credentials = create_credentials_from_tokens(access_token, refresh_token, expires_at)
-    credentials = refresh_access_token(credentials)
+    service = await _authorized_service(access_token, refresh_token, expires_at)
     
     try:
-        service = get_drive_service(credentials)
         
         # Prepare folder metadata
         folder_metadata = {
@@ -510,14 +708,15 @@ async def create_drive_folder(
             folder_metadata['parents'] = [parent_folder_id]
         
         # Create folder in Google Drive
-        folder = service.files().create(
+        request = service.files().create(
             body=folder_metadata,
             fields='id, name, mimeType, modifiedTime, createdTime, webViewLink'
-        ).execute()
+        )
+        folder = await asyncio.to_thread(request.execute)
         
         return folder
     except HttpError as e:
-        raise Exception(f"Error creating folder in Google Drive: {e}")
+        raise _drive_error("Error creating folder in Google Drive", e) from e
 
 
 def _force_credentials_utc(credentials: Credentials) -> Credentials:
@@ -532,12 +731,4 @@ def _force_credentials_utc(credentials: Credentials) -> Credentials:
         else:
             fixed_expiry = exp.astimezone(timezone.utc)
 
-    return Credentials(
-        token=credentials.token,
-        refresh_token=credentials.refresh_token,
-        token_uri=credentials.token_uri,
-        client_id=credentials.client_id,
-        client_secret=credentials.client_secret,
-        scopes=credentials.scopes,
-        expiry=fixed_expiry,
-    )
+    return _rebuild_with_expiry(credentials, fixed_expiry)
@@ -3,6 +3,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# bcrypt cost used unless BCRYPT_ROUNDS overrides it (tests lower it for speed)
+DEFAULT_BCRYPT_ROUNDS = 12
+
 
 class Settings:
     PROJECT_NAME = "MVP Data Room"
@@ -25,6 +28,7 @@ class Settings:
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
     SESSION_TTL_MINUTES = int(os.getenv("SESSION_TTL_MINUTES", "60"))
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", str(DEFAULT_BCRYPT_ROUNDS)))
 
     # Google OAuth 2.0
     GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
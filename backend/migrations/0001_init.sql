@@ -96,6 +96,7 @@ CREATE TABLE IF NOT EXISTS files (
 
 CREATE INDEX IF NOT EXISTS idx_files_is_latest ON files(is_latest) WHERE deleted_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_files_checksum ON files(checksum_sha256) WHERE checksum_sha256 IS NOT NULL AND deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS ix_files_uploader_active ON files(uploader_id, created_at) WHERE deleted_at IS NULL;
 
 CREATE TRIGGER trg_files_updated_at
 BEFORE UPDATE ON files
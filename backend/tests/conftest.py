@@ -1,130 +1,352 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import hmac
 import os
-import tempfile
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import AsyncGenerator
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Callable, Iterator
+from unittest.mock import AsyncMock, Mock
 
+import httpx
 import pytest
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from fastapi import Response
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import StaticPool
 from sqlalchemy import event
-from sqlalchemy.dialects.sqlite.base import SQLiteDialect
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.dialects.postgresql import CITEXT, ENUM, JSONB, INET
 from sqlalchemy.types import String, JSON
+from google.oauth2.credentials import Credentials
 
+from backend.api.auth import GOOGLE_USERINFO_URL
 from backend.app.db import get_session
 from backend.app.main import app
 from backend.app.models.base import Base
 from backend.app.models.user import User
 from backend.app.models.file import File
-from backend.app.security import create_session_token, hash_password
+from backend.app.security import create_session_token
+from backend.app.services import google_drive
+from backend.core.config import settings
+from backend.tests.helpers import TEST_PASSWORD, TEST_USER_EMAIL
 
 
 # Test database URL (in-memory SQLite for tests)
 TEST_DB_URL = "sqlite+aiosqlite:///:memory:"
 
 
-# Map PostgreSQL-specific types to SQLite-compatible types for tests
-@event.listens_for(Base.metadata, "before_create")
-def receive_before_create(target, connection, **kw):
-    """Convert PostgreSQL-specific types to SQLite-compatible types."""
-    if isinstance(connection.dialect, SQLiteDialect):
-        # Map PostgreSQL-specific types to SQLite-compatible types
-        for table in target.tables.values():
-            for column in table.columns:
-                if isinstance(column.type, CITEXT):
-                    column.type = String()
-                elif isinstance(column.type, ENUM):
-                    # Convert ENUM to String for SQLite
-                    column.type = String()
-                elif isinstance(column.type, JSONB):
-                    # Convert JSONB to JSON for SQLite
-                    column.type = JSON()
-                elif isinstance(column.type, INET):
-                    # Convert INET to String for SQLite
-                    column.type = String()
-                # UUID is handled by SQLAlchemy automatically in SQLite
+def _fast_hash_password(password: str) -> str:
+    """SHA-256 stand-in for bcrypt; auth flow tests don't need a slow KDF."""
+    return "sha256$" + hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 
-@pytest.fixture(scope="function")
-async def test_db_session() -> AsyncGenerator[AsyncSession, None]:
-    """Create a test database session."""
+def _fast_verify_password(plain_password: str, hashed_password: str) -> bool:
+    return hmac.compare_digest(_fast_hash_password(plain_password), hashed_password)
+
+
+# Hashed once per session instead of per fixture
+TEST_PASSWORD_HASH = _fast_hash_password(TEST_PASSWORD)
+LARGE_BLOB_SIZE = 10 * 1024 * 1024
+
+
+# PostgreSQL-specific column types and their SQLite-compatible replacements.
+# UUID is handled by SQLAlchemy automatically in SQLite.
+_TYPE_MAP = {
+    CITEXT: String,
+    ENUM: String,
+    INET: String,
+    JSONB: JSON,
+}
+
+
+def _patch_metadata_for_sqlite() -> None:
+    """Convert PostgreSQL-specific types to SQLite-compatible types (once)."""
+    if Base.metadata.info.get("patched_for_sqlite"):
+        return
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            for pg_type, replacement in _TYPE_MAP.items():
+                if isinstance(column.type, pg_type):
+                    column.type = replacement()
+                    break
+    Base.metadata.info["patched_for_sqlite"] = True
+
+
+_patch_metadata_for_sqlite()
+
+
+def pytest_collection_modifyitems(items):
+    """Run every async test on the session loop that owns the shared engine."""
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    """Selector loop on Windows; the Proactor default breaks some DB drivers."""
+    if sys.platform == "win32":
+        return asyncio.WindowsSelectorEventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _fast_password_hashing():
+    """
+    Swap bcrypt for SHA-256 wherever the app looks the helpers up at call time.
+    test_security imports the real functions at module load, so it still
+    exercises bcrypt, at the minimum cost factor.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "BCRYPT_ROUNDS", 4)
+        for module in ("backend.app.security", "backend.api.auth"):
+            mp.setattr(f"{module}.hash_password", _fast_hash_password)
+            mp.setattr(f"{module}.verify_password", _fast_verify_password)
+        yield
+
+
+@pytest.fixture(autouse=True)
+def _reset_token_refresh_state() -> Iterator[None]:
+    """
+    Drop google_drive's process-wide refresh state after each test, so credentials
+    cached by one test (often mocks) are never served to another.
+    """
+    yield
+    for task in google_drive._refresh_tasks.values():
+        task.cancel()
+    google_drive._refresh_tasks.clear()
+    google_drive._refreshed_credentials.clear()
+
+
+@pytest.fixture(scope="session")
+def _database_url() -> str:
+    """
+    SQLite database URL for this pytest process. Under pytest-xdist every worker
+    is a separate process, so the in-memory database is already per-worker; a
+    file URL gets the worker id appended to keep workers apart. Only SQLite is
+    supported: test_engine sets pysqlite connect args and transaction hooks.
+    """
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    url = os.environ.get("TEST_DB_URL", TEST_DB_URL)
+    if url.endswith(":memory:"):
+        return url
+    return f"{url}_{worker_id}"
+
+
+@pytest.fixture(scope="session")
+async def test_engine(_database_url: str) -> AsyncGenerator[AsyncEngine, None]:
+    """Create the test database and its schema once per test session."""
     engine = create_async_engine(
-        TEST_DB_URL,
+        _database_url,
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
     
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    async_session_maker = async_sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
+    # pysqlite's implicit transaction handling breaks SAVEPOINT; emit BEGIN ourselves
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
     
-    async with async_session_maker() as session:
-        yield session
+    @event.listens_for(engine.sync_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
     
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield engine
     
     await engine.dispose()
 
 
 @pytest.fixture(scope="function")
-async def test_client(test_db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
-    """Create a test client with overridden database session."""
+async def test_db_session(test_engine: AsyncEngine) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create a test database session inside a transaction that is rolled back
+    after the test. Commits (in tests or endpoints) only release a savepoint.
+    """
+    async with test_engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(
+            bind=conn,
+            join_transaction_mode="create_savepoint",
+            expire_on_commit=False,
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await trans.rollback()
+
+
+@pytest.fixture(scope="session")
+async def _app_client() -> AsyncGenerator[AsyncClient, None]:
+    """One ASGI client for the whole session, warmed with a health check."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/api/health")
+        yield client
+
+
+@pytest.fixture(scope="function")
+async def test_client(_app_client: AsyncClient, test_db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
+    """Shared test client with the database session overridden for this test."""
     async def override_get_session():
         yield test_db_session
     
     app.dependency_overrides[get_session] = override_get_session
+    _app_client.cookies.clear()
     
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-        yield client
+    yield _app_client
     
     app.dependency_overrides.clear()
 
 
-@pytest.fixture
-def temp_storage_dir(monkeypatch) -> Path:
-    """Create a temporary storage directory for file tests."""
-    temp_dir = tempfile.mkdtemp()
-    storage_path = Path(temp_dir)
+@pytest.fixture(scope="session")
+def temp_storage_dir(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Path]:
+    """
+    Temporary storage directory shared by all file tests. Storage keys embed
+    fresh uuids, so tests never collide and one directory is enough.
+    """
+    root = tmp_path_factory.mktemp("storage")
     # Patch settings.STORAGE_PATH directly since it's cached at import time
-    from backend.core.config import settings
-    monkeypatch.setattr(settings, "STORAGE_PATH", str(storage_path))
-    yield storage_path
-    # Cleanup
-    import shutil
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "STORAGE_PATH", str(root))
+        yield root
+
+
+@pytest.fixture
+def write_stored_file(temp_storage_dir: Path) -> Callable[[str, bytes | memoryview], Path]:
+    """Writes content to disk under a storage key in temp_storage_dir; returns its path."""
+    def _write(storage_key: str, content: bytes | memoryview) -> Path:
+        file_path = temp_storage_dir / storage_key
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+        return file_path
+    return _write
+
+
+@pytest.fixture
+def response() -> Response:
+    """Fresh outgoing Response for calling endpoints that set cookies directly."""
+    return Response()
+
+
+@pytest.fixture(scope="session")
+def large_blob() -> bytes:
+    """10 MiB of non-uniform bytes shared by range-request tests; slice via memoryview."""
+    return bytes(range(256)) * (LARGE_BLOB_SIZE // 256)
+
+
+@pytest.fixture(scope="session")
+def google_creds_mock() -> Mock:
+    """Google Credentials stand-in; spec introspection runs once per session."""
+    creds = Mock(spec=Credentials)
+    creds.token = "test_token"
+    creds.refresh_token = "test_refresh"
+    return creds
+
+
+@pytest.fixture
+def drive_mocks(monkeypatch) -> SimpleNamespace:
+    """Replace the Drive calls and token refresh used by the files API."""
+    mocks = SimpleNamespace(
+        list=AsyncMock(),
+        metadata=AsyncMock(),
+        download=AsyncMock(),
+        refresh=AsyncMock(),
+    )
+    monkeypatch.setattr("backend.api.files.list_drive_files", mocks.list)
+    
+    async def _get_files_metadata(access_token, refresh_token, expires_at, file_ids):
+        # Imports batch the lookup; answer each id from the per-file mock
+        results = {}
+        for file_id in file_ids:
+            try:
+                results[file_id] = await mocks.metadata(access_token, refresh_token, expires_at, file_id)
+            except Exception as exc:
+                results[file_id] = exc
+        return results
+    
+    monkeypatch.setattr("backend.api.files.get_files_metadata", _get_files_metadata)
+    
+    async def _iter_drive_file(*args, **kwargs):
+        # Imports stream the download; serve the mocked bytes as a single chunk
+        content = await mocks.download(*args, **kwargs)
+        if content:
+            yield content
+    
+    monkeypatch.setattr("backend.api.files.iter_drive_file", _iter_drive_file)
+    monkeypatch.setattr("backend.api.files._refresh_and_save_user_tokens", mocks.refresh)
+    return mocks
+
+
+@pytest.fixture
+async def http_mock(monkeypatch) -> AsyncGenerator[SimpleNamespace, None]:
+    """
+    Route backend.api.auth's outbound httpx client through MockTransport.
+    Register responses with `http_mock.routes[url] = httpx.Response(...)`;
+    handled requests are recorded in `http_mock.calls`.
+    """
+    mock = SimpleNamespace(routes={}, calls=[])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        mock.calls.append(request)
+        return mock.routes.get(str(request.url), httpx.Response(404))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True) as client:
+        monkeypatch.setattr("backend.api.auth._http_client", client)
+        yield mock
+
+
+@pytest.fixture
+def oauth_callback_mocks(monkeypatch, http_mock, google_creds_mock) -> SimpleNamespace:
+    """Stub the token exchange and userinfo request made by /api/auth/callback."""
+    tokens = {
+        "access_token": "test_token",
+        "refresh_token": "test_refresh",
+        "expires_in": 3600,
+    }
+    userinfo = {
+        "email": "oauth@example.com",
+        "id": "google123",
+        "name": "OAuth User",
+        "picture": "https://example.com/pic.jpg",
+    }
+    http_mock.routes[GOOGLE_USERINFO_URL] = httpx.Response(200, json=userinfo)
+    mocks = SimpleNamespace(
+        tokens=tokens,
+        userinfo=userinfo,
+        exchange=AsyncMock(return_value=(tokens, google_creds_mock)),
+        http=http_mock,
+    )
+    monkeypatch.setattr("backend.api.auth.exchange_code_for_tokens", mocks.exchange)
+    return mocks
 
 
 @pytest.fixture
 async def test_user(test_db_session: AsyncSession) -> User:
     """Create a test user."""
-    import uuid
     user = User(
         id=uuid.uuid4(),
-        email="test@example.com",
-        password_hash=hash_password("testpassword123"),
+        email=TEST_USER_EMAIL,
+        password_hash=TEST_PASSWORD_HASH,
         status="active",
         full_name="Test User",
     )
     test_db_session.add(user)
-    await test_db_session.commit()
-    await test_db_session.refresh(user)
+    await test_db_session.flush()
     return user
 
 
 @pytest.fixture
 async def test_user_with_google(test_db_session: AsyncSession) -> User:
     """Create a test user with Google OAuth tokens."""
-    import uuid
-    from datetime import datetime, timedelta, timezone
-    
     user = User(
         id=uuid.uuid4(),
         email="google@example.com",
@@ -136,22 +358,85 @@ async def test_user_with_google(test_db_session: AsyncSession) -> User:
         google_token_expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
     )
     test_db_session.add(user)
-    await test_db_session.commit()
-    await test_db_session.refresh(user)
+    await test_db_session.flush()
+    return user
+
+
+@pytest.fixture
+def fake_user_with_google() -> SimpleNamespace:
+    """
+    Unpersisted stand-in for test_user_with_google, for endpoint tests that only
+    read token attributes off current_user and never load or reference the row.
+    """
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        email="google@example.com",
+        status="active",
+        deleted_at=None,
+        google_access_token="test_access_token",
+        google_refresh_token="test_refresh_token",
+        google_token_expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+
+
+@pytest.fixture
+async def suspended_user(test_db_session: AsyncSession) -> User:
+    """Create a suspended user."""
+    user = User(
+        id=uuid.uuid4(),
+        email="suspended@example.com",
+        password_hash=TEST_PASSWORD_HASH,
+        status="suspended",
+    )
+    test_db_session.add(user)
+    await test_db_session.flush()
+    return user
+
+
+@pytest.fixture(scope="session")
+async def other_user(test_engine: AsyncEngine) -> User:
+    """
+    A second active user who owns no files. Committed once outside the per-test
+    rollback, so it is shared by every test; treat it as read-only.
+    """
+    async with AsyncSession(test_engine, expire_on_commit=False) as session:
+        user = User(
+            id=uuid.uuid4(),
+            email=f"other-{uuid.uuid4().hex}@example.com",
+            status="active",
+        )
+        session.add(user)
+        await session.commit()
     return user
 
 
 @pytest.fixture
-async def auth_cookies(test_user: User) -> dict:
+def param_user(request, other_user) -> User | None:
+    """
+    Resolve the user fixture named by indirect parametrization (None passes through).
+    other_user is requested up front: it commits on the shared connection, so it
+    must exist before test_db_session opens the per-test transaction.
+    """
+    return request.getfixturevalue(request.param) if request.param else None
+
+
+@pytest.fixture(scope="session")
+def auth_cookies_for() -> Callable[[Any], dict]:
+    """Mint session cookies for any user id directly, without the login endpoint."""
+    def _make(user_id: Any) -> dict:
+        return {"session": create_session_token(str(user_id))}
+    return _make
+
+
+@pytest.fixture
+async def auth_cookies(test_user: User, auth_cookies_for) -> dict:
     """Create auth cookies for a test user."""
-    session_token = create_session_token(str(test_user.id))
-    return {"session": session_token}
+    return auth_cookies_for(test_user.id)
 
 
 @pytest.fixture
 async def test_file(test_db_session: AsyncSession, test_user: User) -> File:
     """Create a test file."""
-    import uuid
     file = File(
         id=uuid.uuid4(),
         uploader_id=test_user.id,
@@ -163,7 +448,6 @@ async def test_file(test_db_session: AsyncSession, test_user: User) -> File:
         status="ready",
     )
     test_db_session.add(file)
-    await test_db_session.commit()
-    await test_db_session.refresh(file)
+    await test_db_session.flush()
     return file
 
@@ -0,0 +1,47 @@
+"""Plain helpers and constants shared by test modules (import these, not conftest)."""
+from __future__ import annotations
+
+import itertools
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import pytest
+from fastapi import Response
+from httpx import AsyncClient
+
+# Credentials of the fixture users (see test_user in conftest)
+TEST_USER_EMAIL = "test@example.com"
+TEST_PASSWORD = "testpassword123"
+
+
+_uuid_counter = itertools.count(1)
+
+# Top bit set so counter ids never look like the nil UUID or tiny hand-written ones
+_UUID_HIGH_BIT = 1 << 127
+
+
+def fast_uuid() -> uuid.UUID:
+    """Unique UUID from a counter; for test ids where uuid4()'s randomness isn't needed."""
+    return uuid.UUID(int=next(_uuid_counter) | _UUID_HIGH_BIT)
+
+
+def assert_session_cookie_set(response: Response) -> None:
+    """Fail unless `response` carries a Set-Cookie header for the session cookie."""
+    for name, value in response.raw_headers:
+        if name == b"set-cookie" and value.startswith(b"session="):
+            return
+    pytest.fail("no session cookie set on response")
+
+
+@contextmanager
+def use_cookies(client: AsyncClient, cookies: dict[str, str]) -> Iterator[AsyncClient]:
+    """Send requests with only `cookies`, restoring the client's previous jar on exit."""
+    saved = httpx.Cookies(client.cookies)
+    client.cookies.clear()
+    client.cookies.update(cookies)
+    try:
+        yield client
+    finally:
+        client.cookies = saved
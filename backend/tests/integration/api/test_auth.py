@@ -1,11 +1,9 @@
 from __future__ import annotations
 
-import uuid
-from datetime import datetime, timedelta, timezone
-from unittest.mock import patch, Mock
+import httpx
 import pytest
 
-from backend.app.models.user import User
+from backend.tests.helpers import TEST_PASSWORD
 
 
 @pytest.mark.asyncio
@@ -36,7 +34,7 @@ class TestAuthIntegration:
             "/api/auth/login",
             json={
                 "email": test_user.email,
-                "password": "testpassword123",
+                "password": TEST_PASSWORD,
             },
         )
         
@@ -47,17 +45,28 @@ class TestAuthIntegration:
         # Check that session cookie was set
         assert "session" in response.cookies
     
-    async def test_login_wrong_password(self, test_client, test_db_session, test_user):
-        """Test login with wrong password."""
+    @pytest.mark.parametrize(
+        "param_user,password,expected_status,detail_substr",
+        [
+            ("test_user", "wrongpassword", 401, None),
+            ("suspended_user", TEST_PASSWORD, 403, "suspended"),
+        ],
+        ids=["wrong_password", "suspended"],
+        indirect=["param_user"],
+    )
+    async def test_login_errors(self, test_client, param_user, password, expected_status, detail_substr):
+        """Test login failures."""
         response = await test_client.post(
             "/api/auth/login",
             json={
-                "email": test_user.email,
-                "password": "wrongpassword",
+                "email": param_user.email,
+                "password": password,
             },
         )
         
-        assert response.status_code == 401
+        assert response.status_code == expected_status
+        if detail_substr:
+            assert detail_substr in response.json()["detail"].lower()
     
     async def test_get_user_authenticated(self, test_client, test_db_session, test_user, auth_cookies):
         """Test getting current user when authenticated."""
@@ -122,79 +131,46 @@ class TestAuthIntegration:
         assert data["full_name"] == "Google User"
         assert "session" in response.cookies
     
-    async def test_register_duplicate_email(self, test_client, test_db_session, test_user):
-        """Test registering with duplicate email."""
-        response = await test_client.post(
-            "/api/auth/register",
-            json={
-                "email": test_user.email,
-                "password": "password123",
-            },
-        )
-        
-        assert response.status_code == 400
-        assert "already exists" in response.json()["detail"].lower()
-    
-    async def test_register_short_password(self, test_client, test_db_session):
-        """Test registering with short password."""
+    @pytest.mark.parametrize(
+        "param_user,password,detail_substr",
+        [
+            ("test_user", "password123", "already exists"),
+            (None, "short", "8 characters"),
+        ],
+        ids=["duplicate_email", "short_password"],
+        indirect=["param_user"],
+    )
+    async def test_register_errors(self, test_client, param_user, password, detail_substr):
+        """Test registration failures."""
+        email = param_user.email if param_user else "user@example.com"
         response = await test_client.post(
             "/api/auth/register",
             json={
-                "email": "user@example.com",
-                "password": "short",
+                "email": email,
+                "password": password,
             },
         )
         
         assert response.status_code == 400
-        assert "8 characters" in response.json()["detail"].lower()
+        assert detail_substr in response.json()["detail"].lower()
     
-    async def test_login_suspended_user(self, test_client, test_db_session):
-        """Test login with suspended user."""
-        from backend.app.security import hash_password
+    async def test_get_avatar(self, test_client, test_db_session, test_user_with_google, auth_cookies_for, http_mock):
+        """Test getting user avatar."""
+        test_user_with_google.avatar_url = "https://example.com/avatar.jpg"
+        await test_db_session.flush()
         
-        suspended_user = User(
-            id=uuid.uuid4(),
-            email="suspended@example.com",
-            password_hash=hash_password("password123"),
-            status="suspended",
+        http_mock.routes["https://example.com/avatar.jpg"] = httpx.Response(
+            200, content=b"image_data", headers={"Content-Type": "image/jpeg"}
         )
-        test_db_session.add(suspended_user)
-        await test_db_session.commit()
         
-        response = await test_client.post(
-            "/api/auth/login",
-            json={
-                "email": suspended_user.email,
-                "password": "password123",
-            },
+        test_client.cookies.update(auth_cookies_for(test_user_with_google.id))
+        response = await test_client.get(
+            "/api/auth/avatar",
         )
         
-        assert response.status_code == 403
-        assert "suspended" in response.json()["detail"].lower()
-    
-    async def test_get_avatar(self, test_client, test_db_session, test_user_with_google, auth_cookies):
-        """Test getting user avatar."""
-        test_user_with_google.avatar_url = "https://example.com/avatar.jpg"
-        await test_db_session.commit()
-        
-        # Update auth cookies for the correct user
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
-        
-        with patch("backend.api.auth.requests.get") as mock_get:
-            mock_response = Mock()
-            mock_response.headers = {"Content-Type": "image/jpeg"}
-            mock_response.iter_content.return_value = [b"image_data"]
-            mock_response.raise_for_status = Mock()
-            mock_get.return_value = mock_response
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.get(
-                "/api/auth/avatar",
-            )
-            
-            assert response.status_code == 200
-            mock_get.assert_called_once()
+        assert response.status_code == 200
+        assert response.content == b"image_data"
+        assert len(http_mock.calls) == 1
     
     async def test_get_avatar_not_found(self, test_client, test_db_session, test_user, auth_cookies):
         """Test getting avatar when user has no avatar."""
@@ -205,57 +181,31 @@ class TestAuthIntegration:
         
         assert response.status_code == 404
     
-    async def test_oauth_initiate_flow(self, test_client):
+    async def test_oauth_initiate_flow(self, test_client, monkeypatch):
         """Test initiating OAuth flow."""
-        with patch("backend.api.auth.settings") as mock_settings, \
-             patch("backend.api.auth.get_authorization_url") as mock_auth_url:
-            
-            mock_settings.GOOGLE_CLIENT_ID = "test_client_id"
-            mock_auth_url.return_value = "https://accounts.google.com/o/oauth2/auth"
-            
-            response = await test_client.get("/api/auth/login")
-            
-            # Should redirect
-            assert response.status_code in [302, 307]
+        monkeypatch.setattr("backend.api.auth.settings.GOOGLE_CLIENT_ID", "test_client_id")
+        monkeypatch.setattr(
+            "backend.api.auth.get_authorization_url",
+            lambda *args, **kwargs: "https://accounts.google.com/o/oauth2/auth",
+        )
+        
+        response = await test_client.get("/api/auth/login")
+        
+        # Should redirect
+        assert response.status_code in [302, 307]
     
-    async def test_oauth_callback_success(self, test_client, test_db_session):
+    @pytest.mark.slow
+    async def test_oauth_callback_success(self, test_client, test_db_session, oauth_callback_mocks, monkeypatch):
         """Test OAuth callback success."""
-        with patch("backend.api.auth.exchange_code_for_tokens") as mock_exchange, \
-             patch("backend.api.auth.requests.get") as mock_get, \
-             patch("backend.api.auth.settings") as mock_settings:
-            
-            mock_settings.CORS_ORIGINS = ["http://localhost:3000"]
-            mock_settings.IS_PRODUCTION = False
-            
-            # Mock token exchange
-            from google.oauth2.credentials import Credentials
-            
-            mock_tokens = {
-                "access_token": "test_token",
-                "refresh_token": "test_refresh",
-                "expires_in": 3600,
-            }
-            mock_creds = Mock(spec=Credentials)
-            mock_creds.token = "test_token"
-            mock_creds.refresh_token = "test_refresh"
-            mock_exchange.return_value = (mock_tokens, mock_creds)
-            
-            # Mock userinfo API call
-            mock_userinfo_response = Mock()
-            mock_userinfo_response.json.return_value = {
-                "email": "oauth@example.com",
-                "id": "google123",
-                "name": "OAuth User",
-                "picture": "https://example.com/pic.jpg",
-            }
-            mock_userinfo_response.raise_for_status = Mock()
-            mock_get.return_value = mock_userinfo_response
-            
-            response = await test_client.get(
-                "/api/auth/callback",
-                params={"code": "test_code"},
-            )
-            
-            # Should redirect
-            assert response.status_code in [302, 307]
-
+        monkeypatch.setattr("backend.api.auth.settings.CORS_ORIGINS", ["http://localhost:3000"])
+        monkeypatch.setattr("backend.api.auth.settings.IS_PRODUCTION", False)
+        
+        response = await test_client.get(
+            "/api/auth/callback",
+            params={"code": "test_code"},
+        )
+        
+        # Should redirect
+        assert response.status_code in [302, 307]
+        assert response.headers["location"] == "http://localhost:3000/?auth=success"
+        oauth_callback_mocks.exchange.assert_awaited_once_with("test_code")
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
 from datetime import datetime, timedelta, timezone
-from unittest.mock import patch, Mock
 import pytest
 
+from backend.api.files import _IMPORT_CONCURRENCY
 from backend.app.models.file import File
-from backend.app.services.file_storage import save_imported_file, get_file_path
+from backend.tests.helpers import use_cookies
+
+# Simulated Drive download latency; keeps downloads in flight long enough to overlap
+DOWNLOAD_DELAY = 0.1
 
 
 @pytest.mark.asyncio
@@ -41,38 +45,34 @@ class TestFilesIntegration:
         
         assert response.status_code == 401
     
-    async def test_list_drive_files_success(self, test_client, test_db_session, test_user_with_google):
+    async def test_list_drive_files_success(self, test_client, test_db_session, test_user_with_google, auth_cookies_for, drive_mocks):
         """Test listing Google Drive files."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
+        auth_cookies = auth_cookies_for(test_user_with_google.id)
         
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.list_drive_files") as mock_list:
-            
-            mock_list.return_value = {
-                "files": [
-                    {
-                        "id": "drive_file_1",
-                        "name": "test.pdf",
-                        "mimeType": "application/pdf",
-                        "size": "1024",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/file1",
-                    }
-                ],
-                "next_page_token": None,
-            }
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.get(
-                "/api/files/drive",
-                params={"page_size": 20},
-            )
-            
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data["files"]) == 1
-            assert data["files"][0]["id"] == "drive_file_1"
+        drive_mocks.list.return_value = {
+            "files": [
+                {
+                    "id": "drive_file_1",
+                    "name": "test.pdf",
+                    "mimeType": "application/pdf",
+                    "size": "1024",
+                    "modifiedTime": "2024-01-01T00:00:00Z",
+                    "webViewLink": "https://drive.google.com/file1",
+                }
+            ],
+            "next_page_token": None,
+        }
+        
+        test_client.cookies.update(auth_cookies)
+        response = await test_client.get(
+            "/api/files/drive",
+            params={"page_size": 20},
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["files"]) == 1
+        assert data["files"][0]["id"] == "drive_file_1"
     
     async def test_list_drive_files_no_token(self, test_client, test_user, auth_cookies):
         """Test listing drive files without Google token."""
@@ -84,45 +84,14 @@ class TestFilesIntegration:
         assert response.status_code == 403
         assert "Google Drive is not connected" in response.json()["detail"]
     
-    async def test_import_files_success(self, test_client, test_db_session, test_user_with_google, temp_storage_dir):
-        """Test importing files from Google Drive."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
-        
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "test.pdf",
-                "mimeType": "application/pdf",
-                "size": "1024",
-                "webViewLink": "https://drive.google.com/file1",
-            }
-            mock_download.return_value = b"file content"
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.post(
-                "/api/files/import",
-                json={"file_ids": ["drive_file_1"]},
-            )
-            
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data["imported"]) == 1
-            assert len(data["skipped"]) == 0
-            assert len(data["failed"]) == 0
-    
-    async def test_import_files_already_imported(self, test_client, test_db_session, test_user_with_google, test_file):
+    async def test_import_files_already_imported(self, test_client, test_db_session, test_user_with_google, test_file, auth_cookies_for):
         """Test importing file that's already imported."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
+        auth_cookies = auth_cookies_for(test_user_with_google.id)
         
         # Set drive_file_id and uploader_id
         test_file.drive_file_id = "drive_file_1"
         test_file.uploader_id = test_user_with_google.id
-        await test_db_session.commit()
+        await test_db_session.flush()
         
         test_client.cookies.update(auth_cookies)
         response = await test_client.post(
@@ -136,91 +105,52 @@ class TestFilesIntegration:
         assert len(data["skipped"]) == 1
         assert data["skipped"][0]["reason"] == "already_imported"
     
-    async def test_import_files_unsupported_type(self, test_client, test_db_session, test_user_with_google):
+    async def test_import_files_unsupported_type(self, test_client, test_db_session, test_user_with_google, auth_cookies_for, drive_mocks):
         """Test importing unsupported file type."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
+        auth_cookies = auth_cookies_for(test_user_with_google.id)
         
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "test.gdoc",
-                "mimeType": "application/vnd.google-apps.document",
-            }
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.post(
-                "/api/files/import",
-                json={"file_ids": ["drive_file_1"]},
-            )
-            
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data["imported"]) == 0
-            assert len(data["skipped"]) == 1
-            assert data["skipped"][0]["reason"] == "unsupported_type"
-    
-    async def test_view_file_success(self, test_client, test_db_session, test_user, test_file, temp_storage_dir, auth_cookies):
-        """Test viewing a file."""
-        # Create the actual file on disk
-        file_path = get_file_path(test_file.storage_key)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(b"test file content")
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_1",
+            "name": "test.gdoc",
+            "mimeType": "application/vnd.google-apps.document",
+        }
         
         test_client.cookies.update(auth_cookies)
-        response = await test_client.get(
-            f"/api/files/{test_file.id}/view",
+        response = await test_client.post(
+            "/api/files/import",
+            json={"file_ids": ["drive_file_1"]},
         )
         
         assert response.status_code == 200
-        assert response.headers["content-type"] == "application/pdf"
-    
-    async def test_view_file_not_found(self, test_client, test_user, auth_cookies):
-        """Test viewing non-existent file."""
-        test_client.cookies.update(auth_cookies)
-        response = await test_client.get(
-            f"/api/files/{uuid.uuid4()}/view",
-        )
-        
-        assert response.status_code == 404
+        data = response.json()
+        assert len(data["imported"]) == 0
+        assert len(data["skipped"]) == 1
+        assert data["skipped"][0]["reason"] == "unsupported_type"
     
-    async def test_view_file_wrong_user(self, test_client, test_db_session, test_user, test_file):
-        """Test viewing file owned by another user."""
-        # Create another user
-        from backend.app.models.user import User
-        from backend.app.security import create_session_token
-        
-        other_user = User(
-            id=uuid.uuid4(),
-            email="other@example.com",
-            status="active",
-        )
-        test_db_session.add(other_user)
-        await test_db_session.commit()
-        
-        other_auth_cookies = {"session": create_session_token(str(other_user.id))}
+    async def test_view_file_success(self, test_client, test_db_session, test_user, test_file, write_stored_file, auth_cookies):
+        """Test viewing a file."""
+        write_stored_file(test_file.storage_key, b"test file content")
         
-        test_client.cookies.clear()
-        test_client.cookies.update(other_auth_cookies)
+        test_client.cookies.update(auth_cookies)
         response = await test_client.get(
             f"/api/files/{test_file.id}/view",
         )
         
-        assert response.status_code == 404
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.headers["content-disposition"] == 'attachment; filename="test.pdf"'
+        assert response.content == b"test file content"
     
-    async def test_view_file_range_request(self, test_client, test_db_session, test_user, test_file, temp_storage_dir, auth_cookies):
+    @pytest.mark.slow
+    @pytest.mark.parametrize("size", [10_000, 1024 * 1024, 10 * 1024 * 1024], ids=["10KB", "1MB", "10MB"])
+    async def test_view_file_range_request(self, test_client, test_db_session, test_user, test_file, write_stored_file, auth_cookies, large_blob, size):
         """Test viewing file with range request."""
-        # Create a larger file
-        file_path = get_file_path(test_file.storage_key)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_content = b"x" * 10000
-        file_path.write_bytes(file_content)
+        blob = memoryview(large_blob)
+        write_stored_file(test_file.storage_key, blob[:size])
         
         # Update file size in DB
-        test_file.size_bytes = len(file_content)
-        await test_db_session.commit()
+        test_file.size_bytes = size
+        await test_db_session.flush()
         
         test_client.cookies.update(auth_cookies)
         response = await test_client.get(
@@ -229,14 +159,12 @@ class TestFilesIntegration:
         )
         
         assert response.status_code == 206  # Partial Content
-        assert "Content-Range" in response.headers
+        assert response.headers["Content-Range"] == f"bytes 0-1023/{size}"
+        assert response.content == blob[0:1024]
     
-    async def test_delete_file_success(self, test_client, test_db_session, test_user, test_file, temp_storage_dir, auth_cookies):
+    async def test_delete_file_success(self, test_client, test_db_session, test_user, test_file, write_stored_file, auth_cookies):
         """Test deleting a file."""
-        # Create the actual file on disk
-        file_path = get_file_path(test_file.storage_key)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(b"test content")
+        file_path = write_stored_file(test_file.storage_key, b"test content")
         
         test_client.cookies.update(auth_cookies)
         response = await test_client.delete(
@@ -246,108 +174,86 @@ class TestFilesIntegration:
         assert response.status_code == 204
         
         # Verify file is soft-deleted
-        await test_db_session.refresh(test_file)
+        await test_db_session.refresh(test_file, ["deleted_at"])
         assert test_file.deleted_at is not None
+        assert not file_path.exists()
     
-    async def test_delete_file_not_found(self, test_client, test_user, auth_cookies):
-        """Test deleting non-existent file."""
-        test_client.cookies.update(auth_cookies)
-        response = await test_client.delete(
-            f"/api/files/{uuid.uuid4()}",
-        )
+    @pytest.mark.parametrize(
+        "method,path",
+        [("GET", "/api/files/{fid}/view"), ("DELETE", "/api/files/{fid}")],
+        ids=["view", "delete"],
+    )
+    @pytest.mark.parametrize(
+        "param_user",
+        ["test_user", "other_user"],
+        ids=["not_found", "wrong_user"],
+        indirect=True,
+    )
+    async def test_file_not_accessible(self, test_client, test_file, param_user, auth_cookies_for, method, path):
+        """Test viewing/deleting a missing file or a file owned by another user."""
+        # The owner requests a random id; another user requests the real one
+        fid = uuid.uuid4() if param_user.id == test_file.uploader_id else test_file.id
+        
+        with use_cookies(test_client, auth_cookies_for(param_user.id)):
+            response = await test_client.request(method, path.format(fid=fid))
         
         assert response.status_code == 404
     
-    async def test_delete_file_wrong_user(self, test_client, test_db_session, test_user, test_file):
-        """Test deleting file owned by another user."""
-        # Create another user
-        from backend.app.models.user import User
-        from backend.app.security import create_session_token
+    @pytest.mark.slow
+    @pytest.mark.parametrize(
+        "n,fail_ids,expected",
+        [
+            (1, set(), (1, 0, 0)),
+            (3, set(), (3, 0, 0)),
+            (8, set(), (8, 0, 0)),
+            (16, set(), (16, 0, 0)),
+            (3, {"drive_file_1"}, (2, 0, 1)),
+        ],
+        ids=["single", "3", "8", "16", "partial_failure"],
+    )
+    async def test_import_files(self, test_client, test_db_session, test_user_with_google, temp_storage_dir, auth_cookies_for, drive_mocks, n, fail_ids, expected):
+        """Test importing files from Google Drive; downloads run concurrently and fail independently."""
+        auth_cookies = auth_cookies_for(test_user_with_google.id)
         
-        other_user = User(
-            id=uuid.uuid4(),
-            email="other@example.com",
-            status="active",
-        )
-        test_db_session.add(other_user)
-        await test_db_session.commit()
+        def metadata_side_effect(*args, **kwargs):
+            file_id = kwargs.get("file_id", args[3] if len(args) > 3 else "drive_file_1")
+            return {
+                "id": file_id,
+                "name": f"{file_id}.pdf",
+                "mimeType": "application/pdf",
+                "size": "1024",
+                "webViewLink": f"https://drive.google.com/{file_id}",
+            }
         
-        other_auth_cookies = {"session": create_session_token(str(other_user.id))}
+        in_flight = peak = 0
         
-        test_client.cookies.clear()
-        test_client.cookies.update(other_auth_cookies)
-        response = await test_client.delete(
-            f"/api/files/{test_file.id}",
-        )
+        async def slow_download(*args, **kwargs):
+            nonlocal in_flight, peak
+            file_id = kwargs.get("file_id", args[3] if len(args) > 3 else "drive_file_1")
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(DOWNLOAD_DELAY)
+            finally:
+                in_flight -= 1
+            if file_id in fail_ids:
+                raise Exception("Download failed")
+            return b"file content"
         
-        assert response.status_code == 404
-    
-    async def test_import_files_multiple(self, test_client, test_db_session, test_user_with_google, temp_storage_dir):
-        """Test importing multiple files."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
+        drive_mocks.metadata.side_effect = metadata_side_effect
+        drive_mocks.download.side_effect = slow_download
+        file_ids = [f"drive_file_{i}" for i in range(n)]
         
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            def metadata_side_effect(*args, **kwargs):
-                file_id = kwargs.get("file_id", args[3] if len(args) > 3 else "drive_file_1")
-                return {
-                    "id": file_id,
-                    "name": f"{file_id}.pdf",
-                    "mimeType": "application/pdf",
-                    "size": "1024",
-                }
-            
-            mock_metadata.side_effect = metadata_side_effect
-            mock_download.return_value = b"file content"
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.post(
-                "/api/files/import",
-                json={"file_ids": ["drive_file_1", "drive_file_2", "drive_file_3"]},
-            )
-            
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data["imported"]) == 3
-    
-    async def test_import_files_partial_failure(self, test_client, test_db_session, test_user_with_google, temp_storage_dir):
-        """Test importing files with some failures."""
-        from backend.app.security import create_session_token
-        auth_cookies = {"session": create_session_token(str(test_user_with_google.id))}
+        test_client.cookies.update(auth_cookies)
+        response = await test_client.post(
+            "/api/files/import",
+            json={"file_ids": file_ids},
+        )
         
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            def metadata_side_effect(*args, **kwargs):
-                file_id = kwargs.get("file_id", args[3] if len(args) > 3 else "drive_file_1")
-                return {
-                    "id": file_id,
-                    "name": f"{file_id}.pdf",
-                    "mimeType": "application/pdf",
-                }
-            
-            def download_side_effect(*args, **kwargs):
-                file_id = kwargs.get("file_id", args[3] if len(args) > 3 else "drive_file_1")
-                if file_id == "drive_file_2":
-                    raise Exception("Download failed")
-                return b"file content"
-            
-            mock_metadata.side_effect = metadata_side_effect
-            mock_download.side_effect = download_side_effect
-            
-            test_client.cookies.update(auth_cookies)
-            response = await test_client.post(
-                "/api/files/import",
-                json={"file_ids": ["drive_file_1", "drive_file_2", "drive_file_3"]},
-            )
-            
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data["imported"]) == 2
-            assert len(data["failed"]) == 1
-            assert data["failed"][0]["file_id"] == "drive_file_2"
-
+        assert response.status_code == 200
+        data = response.json()
+        assert (len(data["imported"]), len(data["skipped"]), len(data["failed"])) == expected
+        assert [f["drive_file_id"] for f in data["imported"]] == [fid for fid in file_ids if fid not in fail_ids]
+        assert [f["file_id"] for f in data["failed"]] == sorted(fail_ids)
+        # Downloads overlap, up to the import's concurrency limit
+        assert peak == min(n, _IMPORT_CONCURRENCY)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-import uuid
 from datetime import datetime, timedelta, timezone
-from unittest.mock import Mock, patch, AsyncMock
+from unittest.mock import Mock, AsyncMock
+import httpx
 import pytest
 from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.api import auth as auth_module
 from backend.api.auth import (
     register,
     login,
@@ -16,21 +18,35 @@ from backend.api.auth import (
     RegisterRequest,
     LoginRequest,
 )
-from backend.app.models.user import User
+from backend.app.main import app
+from backend.tests.helpers import TEST_PASSWORD, TEST_USER_EMAIL, assert_session_cookie_set
+
+
+# Known-good payloads for the happy paths, built once without re-running validation
+_REGISTER_PAYLOAD = RegisterRequest.model_construct(
+    email="newuser@example.com",
+    password="password123",
+    full_name="New User",
+)
+_PASSWORD_LOGIN_PAYLOAD = LoginRequest.model_construct(
+    email=TEST_USER_EMAIL,
+    password=TEST_PASSWORD,
+)
+_GOOGLE_LOGIN_PAYLOAD = LoginRequest.model_construct(
+    email="google@example.com",
+    google_access_token="test_token",
+    google_refresh_token="test_refresh",
+    expires_in=3600,
+    full_name="Google User",
+    avatar_url="https://example.com/avatar.jpg",
+)
 
 
 @pytest.mark.asyncio
 class TestRegister:
-    async def test_register_success(self, test_db_session):
+    async def test_register_success(self, test_db_session, response):
         """Test successful user registration."""
-        payload = RegisterRequest(
-            email="newuser@example.com",
-            password="password123",
-            full_name="New User",
-        )
-        
-        from fastapi import Response
-        response = Response()
+        payload = _REGISTER_PAYLOAD
         
         result = await register(
             payload=payload,
@@ -41,21 +57,15 @@ class TestRegister:
         assert result.email == payload.email
         assert result.full_name == payload.full_name
         assert result.status == "active"
-        
-        # Check that session cookie was set
-        set_cookie_headers = [header[1].decode() for header in response.raw_headers if b"set-cookie" in header[0].lower()]
-        assert any("session=" in cookie for cookie in set_cookie_headers)
+        assert_session_cookie_set(response)
     
-    async def test_register_duplicate_email(self, test_db_session, test_user):
+    async def test_register_duplicate_email(self, test_db_session, test_user, response):
         """Test registration with duplicate email."""
         payload = RegisterRequest(
             email=test_user.email,
             password="password123",
         )
         
-        from fastapi import Response
-        response = Response()
-        
         with pytest.raises(HTTPException) as exc_info:
             await register(
                 payload=payload,
@@ -66,58 +76,37 @@ class TestRegister:
         assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
         assert "already exists" in exc_info.value.detail.lower()
     
-    async def test_register_short_password(self, test_db_session):
-        """Test registration with short password."""
+    @pytest.mark.parametrize(
+        "password,detail_substr",
+        [("short", "8 characters"), ("a" * 100, "72 bytes")],
+        ids=["short_password", "long_password"],
+    )
+    async def test_register_invalid_password(self, password, detail_substr, response):
+        """Test password length checks reject the request before any database access."""
+        session = AsyncMock(spec=AsyncSession)
         payload = RegisterRequest(
             email="user@example.com",
-            password="short",  # Less than 8 characters
+            password=password,
         )
         
-        from fastapi import Response
-        response = Response()
-        
         with pytest.raises(HTTPException) as exc_info:
             await register(
                 payload=payload,
                 response=response,
-                session=test_db_session,
+                session=session,
             )
         
         assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
-        assert "8 characters" in exc_info.value.detail.lower()
-    
-    async def test_register_long_password(self, test_db_session):
-        """Test registration with password longer than 72 bytes."""
-        payload = RegisterRequest(
-            email="user@example.com",
-            password="a" * 100,  # More than 72 bytes
-        )
-        
-        from fastapi import Response
-        response = Response()
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await register(
-                payload=payload,
-                response=response,
-                session=test_db_session,
-            )
-        
-        assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
-        assert "72 bytes" in exc_info.value.detail.lower()
+        assert detail_substr in exc_info.value.detail.lower()
+        session.execute.assert_not_awaited()
+        session.add.assert_not_called()
 
 
 @pytest.mark.asyncio
 class TestLogin:
-    async def test_login_with_password_success(self, test_db_session, test_user):
+    async def test_login_with_password_success(self, test_db_session, test_user, response):
         """Test successful login with password."""
-        payload = LoginRequest(
-            email=test_user.email,
-            password="testpassword123",
-        )
-        
-        from fastapi import Response
-        response = Response()
+        payload = _PASSWORD_LOGIN_PAYLOAD
         
         result = await login(
             payload=payload,
@@ -126,19 +115,24 @@ class TestLogin:
         )
         
         assert result.email == test_user.email
-        set_cookie_headers = [header[1].decode() for header in response.raw_headers if b"set-cookie" in header[0].lower()]
-        assert any("session=" in cookie for cookie in set_cookie_headers)
+        assert_session_cookie_set(response)
     
-    async def test_login_wrong_password(self, test_db_session, test_user):
-        """Test login with wrong password."""
+    @pytest.mark.parametrize(
+        "param_user,password,expected_status,detail_substr",
+        [
+            ("test_user", "wrongpassword", status.HTTP_401_UNAUTHORIZED, "invalid email or password"),
+            ("suspended_user", TEST_PASSWORD, status.HTTP_403_FORBIDDEN, "suspended"),
+        ],
+        ids=["wrong_password", "suspended"],
+        indirect=["param_user"],
+    )
+    async def test_login_errors(self, test_db_session, param_user, password, expected_status, detail_substr, response):
+        """Test login failures."""
         payload = LoginRequest(
-            email=test_user.email,
-            password="wrongpassword",
+            email=param_user.email,
+            password=password,
         )
         
-        from fastapi import Response
-        response = Response()
-        
         with pytest.raises(HTTPException) as exc_info:
             await login(
                 payload=payload,
@@ -146,72 +140,31 @@ class TestLogin:
                 session=test_db_session,
             )
         
-        assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
-        assert "Invalid email or password" in exc_info.value.detail
+        assert exc_info.value.status_code == expected_status
+        assert detail_substr in exc_info.value.detail.lower()
     
-    async def test_login_nonexistent_user(self, test_db_session):
+    async def test_login_nonexistent_user(self, response):
         """Test login with nonexistent user."""
+        session = AsyncMock(spec=AsyncSession)
+        session.execute.return_value = Mock(scalar_one_or_none=Mock(return_value=None))
         payload = LoginRequest(
             email="nonexistent@example.com",
             password="password123",
         )
         
-        from fastapi import Response
-        response = Response()
-        
         with pytest.raises(HTTPException) as exc_info:
             await login(
                 payload=payload,
                 response=response,
-                session=test_db_session,
+                session=session,
             )
         
         assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+        session.execute.assert_awaited_once()
     
-    async def test_login_suspended_user(self, test_db_session):
-        """Test login with suspended user."""
-        from backend.app.security import hash_password
-        
-        suspended_user = User(
-            id=uuid.uuid4(),
-            email="suspended@example.com",
-            password_hash=hash_password("password123"),
-            status="suspended",
-        )
-        test_db_session.add(suspended_user)
-        await test_db_session.commit()
-        
-        payload = LoginRequest(
-            email=suspended_user.email,
-            password="password123",
-        )
-        
-        from fastapi import Response
-        response = Response()
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await login(
-                payload=payload,
-                response=response,
-                session=test_db_session,
-            )
-        
-        assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
-        assert "suspended" in exc_info.value.detail.lower()
-    
-    async def test_login_google_oauth_new_user(self, test_db_session):
+    async def test_login_google_oauth_new_user(self, test_db_session, response):
         """Test login with Google OAuth for new user."""
-        payload = LoginRequest(
-            email="google@example.com",
-            google_access_token="test_token",
-            google_refresh_token="test_refresh",
-            expires_in=3600,
-            full_name="Google User",
-            avatar_url="https://example.com/avatar.jpg",
-        )
-        
-        from fastapi import Response
-        response = Response()
+        payload = _GOOGLE_LOGIN_PAYLOAD
         
         result = await login(
             payload=payload,
@@ -222,7 +175,7 @@ class TestLogin:
         assert result.email == payload.email
         assert result.full_name == payload.full_name
     
-    async def test_login_google_oauth_existing_user(self, test_db_session, test_user_with_google):
+    async def test_login_google_oauth_existing_user(self, test_db_session, test_user_with_google, response):
         """Test login with Google OAuth for existing user."""
         payload = LoginRequest(
             email=test_user_with_google.email,
@@ -231,9 +184,6 @@ class TestLogin:
             expires_in=3600,
         )
         
-        from fastapi import Response
-        response = Response()
-        
         result = await login(
             payload=payload,
             response=response,
@@ -242,17 +192,14 @@ class TestLogin:
         
         assert result.email == test_user_with_google.email
         # Verify tokens were updated
-        await test_db_session.refresh(test_user_with_google)
+        await test_db_session.refresh(test_user_with_google, ["google_access_token"])
         assert test_user_with_google.google_access_token == "new_token"
 
 
 @pytest.mark.asyncio
 class TestLogout:
-    async def test_logout(self):
+    async def test_logout(self, response):
         """Test logout."""
-        from fastapi import Response
-        response = Response()
-        
         result = await logout(response=response)
         
         assert result["status"] == "ok"
@@ -264,19 +211,15 @@ class TestLogout:
 
 @pytest.mark.asyncio
 class TestRefresh:
-    async def test_refresh_success(self, test_user):
+    async def test_refresh_success(self, test_user, response):
         """Test refreshing session token."""
-        from fastapi import Response
-        response = Response()
-        
         result = await refresh(
             response=response,
             current_user=test_user,
         )
         
         assert result.email == test_user.email
-        set_cookie_headers = [header[1].decode() for header in response.raw_headers if b"set-cookie" in header[0].lower()]
-        assert any("session=" in cookie for cookie in set_cookie_headers)
+        assert_session_cookie_set(response)
 
 
 @pytest.mark.asyncio
@@ -291,26 +234,30 @@ class TestGetUser:
 
 @pytest.mark.asyncio
 class TestGetAvatar:
-    async def test_get_avatar_success(self, test_user_with_google):
+    async def test_get_avatar_success(self, test_user_with_google, http_mock):
         """Test getting user avatar."""
         test_user_with_google.avatar_url = "https://example.com/avatar.jpg"
+        http_mock.routes[test_user_with_google.avatar_url] = httpx.Response(
+            200, content=b"image_data", headers={"Content-Type": "image/jpeg"}
+        )
         
-        with patch("backend.api.auth.requests.get") as mock_get:
-            mock_response = Mock()
-            mock_response.headers = {"Content-Type": "image/jpeg"}
-            mock_response.iter_content.return_value = [b"image_data"]
-            mock_response.raise_for_status = Mock()
-            mock_get.return_value = mock_response
-            
-            result = await get_avatar(current_user=test_user_with_google)
-            
-            assert result is not None
-            mock_get.assert_called_once_with(
-                test_user_with_google.avatar_url,
-                stream=True,
-                timeout=10,
-                headers={"User-Agent": "Mozilla/5.0 (compatible; DataRoom/1.0)"},
-            )
+        result = await get_avatar(current_user=test_user_with_google)
+        
+        assert result.media_type == "image/jpeg"
+        assert b"".join([chunk async for chunk in result.body_iterator]) == b"image_data"
+        assert len(http_mock.calls) == 1
+        assert str(http_mock.calls[0].url) == test_user_with_google.avatar_url
+        assert http_mock.calls[0].headers["User-Agent"] == "Mozilla/5.0 (compatible; DataRoom/1.0)"
+    
+    async def test_get_avatar_upstream_error(self, test_user_with_google, http_mock):
+        """Test avatar fetch failure maps to 502."""
+        test_user_with_google.avatar_url = "https://example.com/avatar.jpg"
+        http_mock.routes[test_user_with_google.avatar_url] = httpx.Response(500)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await get_avatar(current_user=test_user_with_google)
+        
+        assert exc_info.value.status_code == status.HTTP_502_BAD_GATEWAY
     
     async def test_get_avatar_not_found(self, test_user):
         """Test getting avatar when user has no avatar."""
@@ -322,3 +269,12 @@ class TestGetAvatar:
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
         assert "Avatar not found" in exc_info.value.detail
 
+
+@pytest.mark.asyncio
+class TestShutdown:
+    async def test_lifespan_closes_http_client(self, http_mock):
+        """Test app shutdown closes the shared outbound HTTP client."""
+        async with app.router.lifespan_context(app):
+            assert not auth_module._http_client.is_closed
+        
+        assert auth_module._http_client.is_closed
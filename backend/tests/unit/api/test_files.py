@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
 from datetime import datetime, timedelta, timezone
-from unittest.mock import Mock, patch, AsyncMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
 import pytest
 from fastapi import HTTPException, status
+from google.auth.exceptions import RefreshError
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.api.files import (
     list_imported_files,
@@ -13,9 +18,16 @@ from backend.api.files import (
     view_file,
     delete_file_endpoint,
     ImportFilesRequest,
-    _get_valid_web_view_link,
+    _refresh_and_save_user_tokens,
 )
 from backend.app.models.file import File
+from backend.app.services.google_drive import DriveAPIError, _refresh_tasks
+
+# Soft-delete timestamp; tests only need some past instant
+_UTC_NOW = datetime.now(timezone.utc)
+
+# view_file only reads request.headers; a plain stub skips Mock(spec=Request) introspection
+_VIEW_REQUEST = SimpleNamespace(headers={})
 
 
 @pytest.mark.asyncio
@@ -51,10 +63,10 @@ class TestListImportedFiles:
             mime_type="application/pdf",
             size_bytes=1024,
             status="ready",
-            deleted_at=datetime.now(timezone.utc),
+            deleted_at=_UTC_NOW,
         )
         test_db_session.add(deleted_file)
-        await test_db_session.commit()
+        await test_db_session.flush()
         
         result = await list_imported_files(
             session=test_db_session,
@@ -66,118 +78,44 @@ class TestListImportedFiles:
 
 @pytest.mark.asyncio
 class TestListDriveFiles:
-    async def test_list_drive_files_success(self, test_db_session, test_user_with_google):
-        """Test listing Google Drive files."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.list_drive_files") as mock_list:
-            
-            mock_list.return_value = {
-                "files": [
-                    {
-                        "id": "drive_file_1",
-                        "name": "test.pdf",
-                        "mimeType": "application/pdf",
-                        "size": "1024",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/file1",
-                    }
-                ],
-                "next_page_token": None,
-            }
-            
-            result = await list_drive_files_endpoint(
-                page_size=20,
-                page_token=None,
-                current_user=test_user_with_google,
-                session=test_db_session,
-            )
-            
-            assert len(result.files) == 1
-            assert result.files[0].id == "drive_file_1"
-            assert result.files[0].name == "test.pdf"
-            assert result.files[0].is_folder is False
-    
-    async def test_list_drive_files_includes_folders(self, test_db_session, test_user_with_google):
-        """Test listing Google Drive files includes folders."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.list_drive_files") as mock_list:
-            
-            mock_list.return_value = {
-                "files": [
-                    {
-                        "id": "drive_file_1",
-                        "name": "test.pdf",
-                        "mimeType": "application/pdf",
-                        "size": "1024",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/file1",
-                    },
-                    {
-                        "id": "drive_folder_1",
-                        "name": "My Folder",
-                        "mimeType": "application/vnd.google-apps.folder",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/folder1",
-                    }
-                ],
-                "next_page_token": None,
-            }
-            
-            result = await list_drive_files_endpoint(
-                page_size=20,
-                page_token=None,
-                current_user=test_user_with_google,
-                session=test_db_session,
-            )
-            
-            assert len(result.files) == 2
-            # Check file
-            file_item = next(f for f in result.files if f.id == "drive_file_1")
-            assert file_item.name == "test.pdf"
-            assert file_item.is_folder is False
-            # Check folder
-            folder_item = next(f for f in result.files if f.id == "drive_folder_1")
-            assert folder_item.name == "My Folder"
-            assert folder_item.is_folder is True
-    
-    async def test_list_drive_files_includes_google_docs(self, test_db_session, test_user_with_google):
-        """Test listing Google Drive files includes Google Docs/Sheets."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.list_drive_files") as mock_list:
-            
-            mock_list.return_value = {
-                "files": [
-                    {
-                        "id": "drive_doc_1",
-                        "name": "My Document",
-                        "mimeType": "application/vnd.google-apps.document",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/doc1",
-                    },
-                    {
-                        "id": "drive_sheet_1",
-                        "name": "My Spreadsheet",
-                        "mimeType": "application/vnd.google-apps.spreadsheet",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/sheet1",
-                    }
-                ],
-                "next_page_token": None,
-            }
-            
-            result = await list_drive_files_endpoint(
-                page_size=20,
-                page_token=None,
-                current_user=test_user_with_google,
-                session=test_db_session,
-            )
-            
-            # All files should be included (no filtering)
-            assert len(result.files) == 2
-            doc_item = next(f for f in result.files if f.id == "drive_doc_1")
-            assert doc_item.name == "My Document"
-            assert doc_item.mime_type == "application/vnd.google-apps.document"
-            assert doc_item.is_folder is False
+    @pytest.mark.parametrize(
+        "mime_type,is_folder",
+        [
+            ("application/pdf", False),
+            ("application/vnd.google-apps.folder", True),
+            # Google Docs/Sheets are listed too (no filtering), but aren't folders
+            ("application/vnd.google-apps.document", False),
+            ("application/vnd.google-apps.spreadsheet", False),
+        ],
+        ids=["file", "folder", "google_doc", "google_sheet"],
+    )
+    async def test_list_drive_files(self, fake_user_with_google, drive_mocks, mime_type, is_folder):
+        """Test listing Google Drive files maps each mime type to is_folder."""
+        drive_mocks.list.return_value = {
+            "files": [
+                {
+                    "id": "drive_item_1",
+                    "name": "My Item",
+                    "mimeType": mime_type,
+                    "modifiedTime": "2024-01-01T00:00:00Z",
+                    "webViewLink": "https://drive.google.com/item1",
+                }
+            ],
+            "next_page_token": None,
+        }
+        
+        result = await list_drive_files_endpoint(
+            page_size=20,
+            page_token=None,
+            current_user=fake_user_with_google,
+            session=AsyncMock(spec=AsyncSession),
+        )
+        
+        assert len(result.files) == 1
+        assert result.files[0].id == "drive_item_1"
+        assert result.files[0].name == "My Item"
+        assert result.files[0].mime_type == mime_type
+        assert result.files[0].is_folder is is_folder
     
     async def test_list_drive_files_no_token(self, test_db_session, test_user):
         """Test listing drive files without Google token."""
@@ -195,38 +133,56 @@ class TestListDriveFiles:
 
 @pytest.mark.asyncio
 class TestImportFiles:
-    async def test_import_files_success(self, test_db_session, test_user_with_google, temp_storage_dir):
+    async def test_import_files_success(self, test_db_session, test_user_with_google, temp_storage_dir, drive_mocks):
         """Test importing files from Google Drive."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "test.pdf",
-                "mimeType": "application/pdf",
-                "size": "1024",
-                "webViewLink": "https://drive.google.com/file1",
-            }
-            mock_download.return_value = b"file content"
-            
-            payload = ImportFilesRequest(file_ids=["drive_file_1"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            assert len(result.imported) == 1
-            assert len(result.skipped) == 0
-            assert len(result.failed) == 0
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_1",
+            "name": "test.pdf",
+            "mimeType": "application/pdf",
+            "size": "1024",
+            "webViewLink": "https://drive.google.com/file1",
+        }
+        drive_mocks.download.return_value = b"file content"
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=test_user_with_google,
+        )
+        
+        assert len(result.imported) == 1
+        assert len(result.skipped) == 0
+        assert len(result.failed) == 0
+    
+    async def test_import_files_duplicate_ids(self, test_db_session, test_user_with_google, temp_storage_dir, drive_mocks):
+        """Test a file id repeated in one request is imported once."""
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_1",
+            "name": "test.pdf",
+            "mimeType": "application/pdf",
+        }
+        drive_mocks.download.return_value = b"file content"
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1", "drive_file_1"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=test_user_with_google,
+        )
+        
+        assert len(result.imported) == 1
+        assert len(result.skipped) == 1
+        assert result.skipped[0].reason == "already_imported"
+        drive_mocks.download.assert_called_once()
     
     async def test_import_files_already_imported(self, test_db_session, test_user_with_google, test_file):
         """Test importing file that's already imported."""
         # Set drive_file_id on test_file
         test_file.drive_file_id = "drive_file_1"
-        await test_db_session.commit()
+        await test_db_session.flush()
         
         payload = ImportFilesRequest(file_ids=["drive_file_1"])
         
@@ -240,9 +196,8 @@ class TestImportFiles:
         assert len(result.skipped) == 1
         assert result.skipped[0].reason == "already_imported"
     
-    async def test_import_files_already_imported_but_deleted(self, test_db_session, test_user_with_google, temp_storage_dir):
+    async def test_import_files_already_imported_but_deleted(self, test_db_session, test_user_with_google, temp_storage_dir, drive_mocks):
         """Test importing file that was previously imported but deleted (soft delete) - should allow re-import."""
-        from datetime import datetime, timezone
         # Create a deleted file with drive_file_id
         deleted_file = File(
             id=uuid.uuid4(),
@@ -254,193 +209,171 @@ class TestImportFiles:
             mime_type="application/pdf",
             size_bytes=1024,
             status="ready",
-            deleted_at=datetime.now(timezone.utc),
+            deleted_at=_UTC_NOW,
         )
         test_db_session.add(deleted_file)
-        await test_db_session.commit()
-        
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_deleted",
-                "name": "deleted.pdf",
-                "mimeType": "application/pdf",
-                "size": "1024",
-                "webViewLink": "https://drive.google.com/file_deleted",
-            }
-            mock_download.return_value = b"file content"
-            
-            payload = ImportFilesRequest(file_ids=["drive_file_deleted"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            # Should allow re-import of deleted file
-            assert len(result.imported) == 1
-            assert len(result.skipped) == 0
-            assert len(result.failed) == 0
-            assert result.imported[0].original_name == "deleted.pdf"
+        await test_db_session.flush()
+        
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_deleted",
+            "name": "deleted.pdf",
+            "mimeType": "application/pdf",
+            "size": "1024",
+            "webViewLink": "https://drive.google.com/file_deleted",
+        }
+        drive_mocks.download.return_value = b"file content"
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_deleted"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=test_user_with_google,
+        )
+        
+        # Should allow re-import of deleted file
+        assert len(result.imported) == 1
+        assert len(result.skipped) == 0
+        assert len(result.failed) == 0
+        assert result.imported[0].original_name == "deleted.pdf"
     
-    async def test_import_files_unsupported_type(self, test_db_session, test_user_with_google):
-        """Test importing unsupported file type (Google Docs)."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "test.gdoc",
-                "mimeType": "application/vnd.google-apps.document",
-            }
-            
-            payload = ImportFilesRequest(file_ids=["drive_file_1"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            assert len(result.imported) == 0
-            assert len(result.skipped) == 1
-            assert result.skipped[0].reason == "unsupported_type"
+    @pytest.mark.parametrize(
+        "mime_type,name",
+        [
+            ("application/vnd.google-apps.document", "test.gdoc"),
+            ("application/vnd.google-makersuite.prompt", "prompt.prompt"),
+            ("application/vnd.google-apps.folder", "My Folder"),
+        ],
+        ids=["google_doc", "ai_studio_prompt", "folder"],
+    )
+    async def test_import_files_unsupported_type(self, test_db_session, fake_user_with_google, drive_mocks, mime_type, name):
+        """Test importing Google Apps files, AI Studio prompts and folders is skipped."""
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_1",
+            "name": name,
+            "mimeType": mime_type,
+        }
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=fake_user_with_google,
+        )
+        
+        assert len(result.imported) == 0
+        assert len(result.skipped) == 1
+        assert result.skipped[0].file_id == "drive_file_1"
+        assert result.skipped[0].reason == "unsupported_type"
+        assert result.skipped[0].file_name == name
     
-    async def test_import_files_unsupported_type_ai_studio(self, test_db_session, test_user_with_google):
-        """Test importing unsupported file type (Google AI Studio prompt)."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "prompt.prompt",
-                "mimeType": "application/vnd.google-makersuite.prompt",
-            }
-            
-            payload = ImportFilesRequest(file_ids=["drive_file_1"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            assert len(result.imported) == 0
-            assert len(result.skipped) == 1
-            assert result.skipped[0].reason == "unsupported_type"
+    @pytest.mark.parametrize(
+        "error,message",
+        [
+            (DriveAPIError("quota", 403, "storageQuotaExceeded"), "Google Drive storage quota exceeded"),
+            (DriveAPIError("forbidden", 403, "insufficientFilePermissions"), "No access to file in Google Drive"),
+            (DriveAPIError("gone", 404), "File not found in Google Drive"),
+        ],
+        ids=["quota", "forbidden", "not_found"],
+    )
+    async def test_import_files_drive_error(self, test_db_session, fake_user_with_google, drive_mocks, error, message):
+        """Test Drive errors map to user-facing messages by status code and reason."""
+        drive_mocks.metadata.side_effect = error
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=fake_user_with_google,
+        )
+        
+        assert len(result.failed) == 1
+        assert result.failed[0].error == message
     
-    async def test_import_files_skips_folders(self, test_db_session, test_user_with_google):
-        """Test importing folders is skipped."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata:
-            
-            mock_metadata.return_value = {
-                "id": "drive_folder_1",
-                "name": "My Folder",
-                "mimeType": "application/vnd.google-apps.folder",
-            }
-            
-            payload = ImportFilesRequest(file_ids=["drive_folder_1"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            assert len(result.imported) == 0
-            assert len(result.skipped) == 1
-            assert result.skipped[0].file_id == "drive_folder_1"
-            assert result.skipped[0].reason == "unsupported_type"
+    @pytest.mark.parametrize(
+        "error,message",
+        [
+            (RefreshError("invalid_grant: Token has been expired or revoked."), "invalid_grant: Token has been expired or revoked."),
+            (DriveAPIError("batch", 401), "Google Drive authorization error. Please try logging in again"),
+        ],
+        ids=["refresh_error", "batch_http_error"],
+    )
+    async def test_import_files_metadata_lookup_fails(self, test_db_session, fake_user_with_google, drive_mocks, monkeypatch, error, message):
+        """Test a failed batched metadata lookup fails each file instead of the whole request."""
+        monkeypatch.setattr("backend.api.files.get_files_metadata", AsyncMock(side_effect=error))
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1", "drive_file_2"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=fake_user_with_google,
+        )
+        
+        assert len(result.imported) == 0
+        assert [(f.file_id, f.error) for f in result.failed] == [
+            ("drive_file_1", message),
+            ("drive_file_2", message),
+        ]
+        drive_mocks.download.assert_not_called()
     
-    async def test_import_files_download_error(self, test_db_session, test_user_with_google):
+    async def test_import_files_download_error(self, test_db_session, fake_user_with_google, drive_mocks):
         """Test importing file with download error."""
-        with patch("backend.api.files._refresh_and_save_user_tokens"), \
-             patch("backend.api.files.get_file_metadata") as mock_metadata, \
-             patch("backend.api.files.download_drive_file") as mock_download:
-            
-            mock_metadata.return_value = {
-                "id": "drive_file_1",
-                "name": "test.pdf",
-                "mimeType": "application/pdf",
-            }
-            mock_download.side_effect = Exception("Download failed")
-            
-            payload = ImportFilesRequest(file_ids=["drive_file_1"])
-            
-            result = await import_files(
-                payload=payload,
-                session=test_db_session,
-                current_user=test_user_with_google,
-            )
-            
-            assert len(result.imported) == 0
-            assert len(result.failed) == 1
+        drive_mocks.metadata.return_value = {
+            "id": "drive_file_1",
+            "name": "test.pdf",
+            "mimeType": "application/pdf",
+        }
+        drive_mocks.download.side_effect = Exception("Download failed")
+        
+        payload = ImportFilesRequest(file_ids=["drive_file_1"])
+        
+        result = await import_files(
+            payload=payload,
+            session=test_db_session,
+            current_user=fake_user_with_google,
+        )
+        
+        assert len(result.imported) == 0
+        assert len(result.failed) == 1
 
 
 @pytest.mark.asyncio
 class TestViewFile:
-    async def test_view_file_success(self, test_db_session, test_user, test_file, temp_storage_dir):
+    async def test_view_file_success(self, test_db_session, test_user, test_file, write_stored_file):
         """Test viewing a file."""
-        # Create the actual file on disk
-        from backend.app.services.file_storage import get_file_path
-        file_path = get_file_path(test_file.storage_key)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(b"test file content")
-        
-        from fastapi import Request
-        mock_request = Mock(spec=Request)
-        mock_request.headers = {}
+        file_path = write_stored_file(test_file.storage_key, b"test file content")
         
         result = await view_file(
             file_id=str(test_file.id),
-            request=mock_request,
+            request=_VIEW_REQUEST,
             session=test_db_session,
             current_user=test_user,
         )
         
-        assert result is not None
+        assert isinstance(result, FileResponse)
+        assert result.path == str(file_path)
     
     async def test_view_file_not_found(self, test_db_session, test_user):
         """Test viewing non-existent file."""
-        from fastapi import Request
-        mock_request = Mock(spec=Request)
-        mock_request.headers = {}
-        
         with pytest.raises(HTTPException) as exc_info:
             await view_file(
                 file_id=str(uuid.uuid4()),
-                request=mock_request,
+                request=_VIEW_REQUEST,
                 session=test_db_session,
                 current_user=test_user,
             )
         
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
     
-    async def test_view_file_wrong_user(self, test_db_session, test_user, test_file):
+    async def test_view_file_wrong_user(self, test_db_session, test_user, test_file, other_user):
         """Test viewing file owned by another user."""
-        # Create another user
-        from backend.app.models.user import User
-        
-        other_user = User(
-            id=uuid.uuid4(),
-            email="other@example.com",
-            status="active",
-        )
-        test_db_session.add(other_user)
-        await test_db_session.commit()
-        
-        from fastapi import Request
-        mock_request = Mock(spec=Request)
-        mock_request.headers = {}
-        
         with pytest.raises(HTTPException) as exc_info:
             await view_file(
                 file_id=str(test_file.id),
-                request=mock_request,
+                request=_VIEW_REQUEST,
                 session=test_db_session,
                 current_user=other_user,
             )
@@ -450,16 +383,9 @@ class TestViewFile:
 
 @pytest.mark.asyncio
 class TestDeleteFile:
-    async def test_delete_file_success(self, test_db_session, test_user, test_file, temp_storage_dir):
+    async def test_delete_file_success(self, test_db_session, test_user, test_file, write_stored_file, response):
         """Test deleting a file."""
-        # Create the actual file on disk
-        from backend.app.services.file_storage import get_file_path
-        file_path = get_file_path(test_file.storage_key)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(b"test content")
-        
-        from fastapi import Response
-        response = Response()
+        write_stored_file(test_file.storage_key, b"test content")
         
         result = await delete_file_endpoint(
             file_id=str(test_file.id),
@@ -472,14 +398,11 @@ class TestDeleteFile:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         
         # Verify file is soft-deleted
-        await test_db_session.refresh(test_file)
+        await test_db_session.refresh(test_file, ["deleted_at"])
         assert test_file.deleted_at is not None
     
-    async def test_delete_file_not_found(self, test_db_session, test_user):
+    async def test_delete_file_not_found(self, test_db_session, test_user, response):
         """Test deleting non-existent file."""
-        from fastapi import Response
-        response = Response()
-        
         with pytest.raises(HTTPException) as exc_info:
             await delete_file_endpoint(
                 file_id=str(uuid.uuid4()),
@@ -491,37 +414,29 @@ class TestDeleteFile:
         assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
 
 
-class TestWebViewLinkValidation:
-    """Test webViewLink validation and generation."""
-    
-    def test_valid_web_view_link(self):
-        """Test that valid Google Drive link is returned as-is."""
-        link = "https://drive.google.com/file/d/abc123/view"
-        result = _get_valid_web_view_link(link, "abc123")
-        assert result == link
-    
-    def test_invalid_web_view_link_replaced(self):
-        """Test that invalid link (e.g., aistudio.google.com) is replaced with correct one."""
-        invalid_link = "https://aistudio.google.com/app/prompts/"
-        drive_file_id = "abc123"
-        result = _get_valid_web_view_link(invalid_link, drive_file_id)
-        assert result == "https://drive.google.com/file/d/abc123/view"
-        assert result != invalid_link
-    
-    def test_none_web_view_link_generated(self):
-        """Test that None link is generated from drive_file_id."""
-        drive_file_id = "abc123"
-        result = _get_valid_web_view_link(None, drive_file_id)
-        assert result == "https://drive.google.com/file/d/abc123/view"
-    
-    def test_no_link_no_id_returns_none(self):
-        """Test that None is returned when both link and drive_file_id are None."""
-        result = _get_valid_web_view_link(None, None)
-        assert result is None
-    
-    def test_empty_string_link_generated(self):
-        """Test that empty string link is treated as None and generated."""
-        drive_file_id = "abc123"
-        result = _get_valid_web_view_link("", drive_file_id)
-        assert result == "https://drive.google.com/file/d/abc123/view"
-
+@pytest.mark.asyncio
+class TestRefreshAndSaveUserTokens:
+    @pytest.mark.parametrize(
+        "seconds_left,waits",
+        [(30, True), (180, False)],
+        ids=["expiring_waits", "stale_in_background"],
+    )
+    async def test_concurrent_requests_refresh_once(self, test_db_session, test_user_with_google, monkeypatch, seconds_left, waits):
+        """Test concurrent requests share one refresh and the new token is saved to the user."""
+        user = test_user_with_google
+        user.google_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=seconds_left)
+        new_expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        mock_refresh = Mock(return_value=Mock(token="new_token", refresh_token=user.google_refresh_token, expiry=new_expiry))
+        monkeypatch.setattr("backend.app.services.google_drive.refresh_access_token", mock_refresh)
+        
+        await asyncio.gather(*(_refresh_and_save_user_tokens(user, test_db_session) for _ in range(3)))
+        await asyncio.gather(*_refresh_tasks.values())
+        if not waits:
+            # Served the current token; the background result is saved by the next request
+            assert user.google_access_token == "test_access_token"
+            await _refresh_and_save_user_tokens(user, test_db_session)
+        
+        mock_refresh.assert_called_once()
+        assert user.google_access_token == "new_token"
+        # SQLite hands the reloaded timestamp back naive
+        assert user.google_token_expires_at.replace(tzinfo=timezone.utc) == new_expiry
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.api.files import _get_valid_web_view_link
+
+
+@pytest.mark.parametrize(
+    "link,drive_file_id,expected",
+    [
+        # Valid Google Drive link is returned as-is
+        ("https://drive.google.com/file/d/abc123/view", "abc123", "https://drive.google.com/file/d/abc123/view"),
+        # Invalid link (e.g. aistudio.google.com) is replaced with the Drive one
+        ("https://aistudio.google.com/app/prompts/", "abc123", "https://drive.google.com/file/d/abc123/view"),
+        # Missing or empty link is generated from drive_file_id
+        (None, "abc123", "https://drive.google.com/file/d/abc123/view"),
+        ("", "abc123", "https://drive.google.com/file/d/abc123/view"),
+        # Nothing to build a link from
+        (None, None, None),
+    ],
+    ids=["valid", "invalid_replaced", "none_generated", "empty_generated", "no_link_no_id"],
+)
+def test_get_valid_web_view_link(link, drive_file_id, expected):
+    """Test webViewLink validation and generation."""
+    assert _get_valid_web_view_link(link, drive_file_id) == expected
@@ -1,22 +1,22 @@
 from __future__ import annotations
 
 import uuid
+from datetime import datetime, timezone
 import pytest
 from fastapi import HTTPException, status
 
 from backend.app.deps import get_current_user
-from backend.app.models.user import User
-from backend.app.security import create_session_token
+
+# Soft-delete timestamp; tests only need some past instant
+_UTC_NOW = datetime.now(timezone.utc)
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_valid_token(test_db_session, test_user):
+async def test_get_current_user_valid_token(test_db_session, test_user, auth_cookies):
     """Test getting current user with valid token."""
-    session_token = create_session_token(str(test_user.id))
-    
     user = await get_current_user(
         session=test_db_session,
-        session_token=session_token,
+        session_token=auth_cookies["session"],
     )
     
     assert user is not None
@@ -27,8 +27,6 @@ async def test_get_current_user_valid_token(test_db_session, test_user):
 @pytest.mark.asyncio
 async def test_get_current_user_no_token():
     """Test getting current user without token."""
-    from sqlalchemy.ext.asyncio import AsyncSession
-    
     with pytest.raises(HTTPException) as exc_info:
         await get_current_user(
             session=None,  # type: ignore
@@ -55,15 +53,21 @@ async def test_get_current_user_invalid_token(test_db_session):
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_nonexistent_user(test_db_session):
-    """Test getting current user that doesn't exist."""
-    nonexistent_user_id = str(uuid.uuid4())
-    session_token = create_session_token(nonexistent_user_id)
+@pytest.mark.parametrize("param_user", [None, "test_user"], ids=["nonexistent", "deleted"], indirect=True)
+async def test_get_current_user_not_found(test_db_session, param_user, auth_cookies_for):
+    """Test getting current user that doesn't exist or is soft-deleted."""
+    if param_user is None:
+        user_id = uuid.uuid4()
+    else:
+        # Soft delete the user
+        param_user.deleted_at = _UTC_NOW
+        await test_db_session.flush()
+        user_id = param_user.id
     
     with pytest.raises(HTTPException) as exc_info:
         await get_current_user(
             session=test_db_session,
-            session_token=session_token,
+            session_token=auth_cookies_for(user_id)["session"],
         )
     
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
@@ -71,37 +75,12 @@ async def test_get_current_user_nonexistent_user(test_db_session):
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_deleted_user(test_db_session, test_user):
-    """Test getting current user that is soft-deleted."""
-    from datetime import datetime, timezone
-    
-    # Soft delete the user
-    test_user.deleted_at = datetime.now(timezone.utc)
-    await test_db_session.commit()
-    
-    session_token = create_session_token(str(test_user.id))
-    
-    with pytest.raises(HTTPException) as exc_info:
-        await get_current_user(
-            session=test_db_session,
-            session_token=session_token,
-        )
-    
-    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
-    assert "User not found" in exc_info.value.detail
-
-
-@pytest.mark.asyncio
-async def test_get_current_user_invalid_uuid_format(test_db_session):
+async def test_get_current_user_invalid_uuid_format(test_db_session, auth_cookies_for):
     """Test getting current user with invalid UUID format in token."""
-    # Create token with invalid UUID format
-    invalid_user_id = "not-a-valid-uuid"
-    session_token = create_session_token(invalid_user_id)
-    
     with pytest.raises(HTTPException) as exc_info:
         await get_current_user(
             session=test_db_session,
-            session_token=session_token,
+            session_token=auth_cookies_for("not-a-valid-uuid")["session"],
         )
     
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
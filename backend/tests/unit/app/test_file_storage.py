@@ -1,26 +1,35 @@
 from __future__ import annotations
 
 import hashlib
-import uuid
 from pathlib import Path
 import pytest
 
 from backend.app.services.file_storage import (
-    save_imported_file,
+    save_imported_stream,
     get_file_path,
     read_file_content,
     delete_file,
 )
+from backend.tests.helpers import fast_uuid
 
 
-def test_save_imported_file(temp_storage_dir):
+async def _save(user_id, file_id, extension, content: bytes):
+    """Stores content through save_imported_stream as one chunk; returns (storage_key, checksum)."""
+    async def chunks():
+        yield content
+    
+    storage_key, checksum, _ = await save_imported_stream(user_id, file_id, extension, chunks())
+    return storage_key, checksum
+
+
+async def test_save_imported_stream_single_chunk(temp_storage_dir):
     """Test saving an imported file."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     extension = "pdf"
     content = b"test file content"
     
-    storage_key, checksum = save_imported_file(
+    storage_key, checksum = await _save(
         user_id=user_id,
         file_id=file_id,
         extension=extension,
@@ -43,14 +52,14 @@ def test_save_imported_file(temp_storage_dir):
     assert file_path.read_bytes() == content
 
 
-def test_save_imported_file_with_dot_extension(temp_storage_dir):
+async def test_save_imported_stream_with_dot_extension(temp_storage_dir):
     """Test saving file with extension that already has a dot."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     extension = ".pdf"
     content = b"test content"
     
-    storage_key, checksum = save_imported_file(
+    storage_key, checksum = await _save(
         user_id=user_id,
         file_id=file_id,
         extension=extension,
@@ -61,13 +70,13 @@ def test_save_imported_file_with_dot_extension(temp_storage_dir):
     assert file_path.suffix == ".pdf"
 
 
-def test_save_imported_file_no_extension(temp_storage_dir):
+async def test_save_imported_stream_no_extension(temp_storage_dir):
     """Test saving file without extension."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     content = b"test content"
     
-    storage_key, checksum = save_imported_file(
+    storage_key, checksum = await _save(
         user_id=user_id,
         file_id=file_id,
         extension=None,
@@ -79,13 +88,67 @@ def test_save_imported_file_no_extension(temp_storage_dir):
     assert file_path.exists()
 
 
-def test_get_file_path(temp_storage_dir):
+async def test_save_imported_stream(temp_storage_dir):
+    """Test streaming an imported file to storage chunk by chunk."""
+    chunks = [b"first chunk,", b"second chunk,", b"last"]
+    
+    async def gen():
+        for chunk in chunks:
+            yield chunk
+    
+    storage_key, checksum, size = await save_imported_stream(
+        user_id=fast_uuid(),
+        file_id=fast_uuid(),
+        extension="txt",
+        chunks=gen(),
+    )
+    
+    content = b"".join(chunks)
+    assert checksum == hashlib.sha256(content).hexdigest()
+    assert size == len(content)
+    assert storage_key.endswith(".txt")
+    assert get_file_path(storage_key).read_bytes() == content
+
+
+async def test_save_imported_stream_failure_removes_partial_file(temp_storage_dir):
+    """Test a failing stream leaves no partial file behind."""
+    file_id = fast_uuid()
+    
+    async def gen():
+        yield b"partial"
+        raise RuntimeError("download interrupted")
+    
+    with pytest.raises(RuntimeError):
+        await save_imported_stream(
+            user_id=fast_uuid(),
+            file_id=file_id,
+            extension="txt",
+            chunks=gen(),
+        )
+    
+    assert not list(temp_storage_dir.rglob(f"{file_id}*"))
+
+
+async def test_save_imported_stream_recreates_removed_dir(temp_storage_dir):
+    """Test saving still works after a cached user directory is removed."""
+    user_id = fast_uuid()
+    storage_key, _ = await _save(user_id, fast_uuid(), "txt", b"first")
+    first_path = get_file_path(storage_key)
+    first_path.unlink()
+    first_path.parent.rmdir()
+    
+    storage_key, _ = await _save(user_id, fast_uuid(), "txt", b"second")
+    
+    assert read_file_content(storage_key) == b"second"
+
+
+async def test_get_file_path(temp_storage_dir):
     """Test getting file path from storage key."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     content = b"test content"
     
-    storage_key, _ = save_imported_file(
+    storage_key, _ = await _save(
         user_id=user_id,
         file_id=file_id,
         extension="txt",
@@ -98,13 +161,13 @@ def test_get_file_path(temp_storage_dir):
     assert storage_key in str(file_path)
 
 
-def test_read_file_content(temp_storage_dir):
+async def test_read_file_content(temp_storage_dir):
     """Test reading file content."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     content = b"test file content for reading"
     
-    storage_key, _ = save_imported_file(
+    storage_key, _ = await _save(
         user_id=user_id,
         file_id=file_id,
         extension="txt",
@@ -123,13 +186,13 @@ def test_read_file_content_not_found(temp_storage_dir):
         read_file_content(storage_key)
 
 
-def test_delete_file(temp_storage_dir):
+async def test_delete_file(temp_storage_dir):
     """Test deleting a file."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     content = b"test content to delete"
     
-    storage_key, _ = save_imported_file(
+    storage_key, _ = await _save(
         user_id=user_id,
         file_id=file_id,
         extension="txt",
@@ -151,13 +214,13 @@ def test_delete_file_not_found(temp_storage_dir):
         delete_file(storage_key)
 
 
-def test_storage_key_format(temp_storage_dir):
+async def test_storage_key_format(temp_storage_dir):
     """Test that storage key has correct format."""
-    user_id = uuid.uuid4()
-    file_id = uuid.uuid4()
+    user_id = fast_uuid()
+    file_id = fast_uuid()
     content = b"test"
     
-    storage_key, _ = save_imported_file(
+    storage_key, _ = await _save(
         user_id=user_id,
         file_id=file_id,
         extension="pdf",
@@ -170,4 +233,3 @@ def test_storage_key_format(temp_storage_dir):
     assert str(user_id) in storage_key
     assert str(file_id) in storage_key
     assert storage_key.endswith(".pdf")
-
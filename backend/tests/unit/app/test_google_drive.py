@@ -1,55 +1,78 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
 from unittest.mock import Mock, patch, AsyncMock
 import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 
+from backend.core.config import settings
 from backend.app.services.google_drive import (
+    DriveAPIError,
+    _authorization_flow,
+    _drive_discovery_doc,
+    _refresh_request,
+    _refresh_tasks,
+    _refreshed_credentials,
+    _store_refreshed,
+    get_fresh_credentials,
+    create_oauth_flow,
     create_credentials_from_tokens,
     refresh_access_token,
     get_authorization_url,
+    get_drive_service,
     list_drive_files,
     download_drive_file,
+    iter_drive_file,
     get_file_metadata,
+    get_files_metadata,
 )
 
 
+@pytest.fixture(autouse=True, scope="module")
+def _google_settings():
+    """Pin the OAuth client settings once for the module instead of per test."""
+    with patch.multiple(
+        settings,
+        GOOGLE_CLIENT_ID="test_client_id",
+        GOOGLE_CLIENT_SECRET="test_secret",
+        GOOGLE_SCOPES=["https://www.googleapis.com/auth/drive.readonly"],
+    ):
+        yield settings
+
+
+# Expiry for mocked credentials; far enough out that no refresh is attempted
+_FRESH_EXPIRY = datetime.now(timezone.utc) + timedelta(hours=1)
+
+
 class TestCreateCredentialsFromTokens:
     def test_create_credentials_with_expiry(self):
         """Test creating credentials with expiry time."""
         expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
         
-        with patch("backend.app.services.google_drive.settings") as mock_settings:
-            mock_settings.GOOGLE_CLIENT_ID = "test_client_id"
-            mock_settings.GOOGLE_CLIENT_SECRET = "test_secret"
-            mock_settings.GOOGLE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-            
-            creds = create_credentials_from_tokens(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=expires_at,
-            )
-            
-            assert creds.token == "test_token"
-            assert creds.refresh_token == "test_refresh"
-            assert creds.expiry is not None
-            assert creds.expiry.tzinfo == timezone.utc
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=expires_at,
+        )
+        
+        assert creds.token == "test_token"
+        assert creds.refresh_token == "test_refresh"
+        assert creds.expiry is not None
+        assert creds.expiry.tzinfo == timezone.utc
     
     def test_create_credentials_without_expiry(self):
         """Test creating credentials without expiry time."""
-        with patch("backend.app.services.google_drive.settings") as mock_settings:
-            mock_settings.GOOGLE_CLIENT_ID = "test_client_id"
-            mock_settings.GOOGLE_CLIENT_SECRET = "test_secret"
-            mock_settings.GOOGLE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-            
-            creds = create_credentials_from_tokens(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=None,
-            )
-            
-            assert creds.token == "test_token"
-            assert creds.refresh_token == "test_refresh"
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=None,
+        )
+        
+        assert creds.token == "test_token"
+        assert creds.refresh_token == "test_refresh"
 
 
 class TestRefreshAccessToken:
@@ -57,54 +80,130 @@ class TestRefreshAccessToken:
         """Test refresh when token is not expired."""
         expires_at = datetime.now(timezone.utc) + timedelta(hours=2)
         
-        with patch("backend.app.services.google_drive.settings") as mock_settings:
-            mock_settings.GOOGLE_CLIENT_ID = "test_client_id"
-            mock_settings.GOOGLE_CLIENT_SECRET = "test_secret"
-            mock_settings.GOOGLE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-            
-            creds = create_credentials_from_tokens(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=expires_at,
-            )
-            
-            refreshed = refresh_access_token(creds)
-            # Should return same credentials without refreshing
-            assert refreshed.token == creds.token
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=expires_at,
+        )
+        
+        refreshed = refresh_access_token(creds)
+        # Should return same credentials without refreshing
+        assert refreshed.token == creds.token
     
-    def test_refresh_when_expired(self):
+    def test_refresh_when_expired(self, monkeypatch):
         """Test refresh when token is expired."""
         expires_at = datetime.now(timezone.utc) - timedelta(hours=1)
         
-        with patch("backend.app.services.google_drive.settings") as mock_settings:
-            mock_settings.GOOGLE_CLIENT_ID = "test_client_id"
-            mock_settings.GOOGLE_CLIENT_SECRET = "test_secret"
-            mock_settings.GOOGLE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-            
-            creds = create_credentials_from_tokens(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=expires_at,
-            )
-            
-            # Mock the refresh method at the class level to intercept the call
-            from google.oauth2.credentials import Credentials
-            original_refresh = Credentials.refresh
-            
-            def mock_refresh(self, request):
-                # Simulate what refresh() does - updates token and expiry in place
-                self.token = "new_token"
-                self.expiry = datetime.now(timezone.utc) + timedelta(hours=1)
-            
-            with patch.object(Credentials, "refresh", mock_refresh):
-                refreshed = refresh_access_token(creds)
-                # Verify the credentials were updated
-                assert refreshed.expiry.tzinfo == timezone.utc
-                assert refreshed.token == "new_token"
-                assert refreshed.expiry > datetime.now(timezone.utc)
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=expires_at,
+        )
+        
+        def mock_refresh(self, request):
+            # Simulate what refresh() does - updates token and expiry in place
+            self.token = "new_token"
+            self.expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        
+        # Replace the refresh method at the class level to intercept the call
+        monkeypatch.setattr(Credentials, "refresh", mock_refresh)
+        refreshed = refresh_access_token(creds)
+        
+        # Verify the credentials were updated
+        assert refreshed.expiry.tzinfo == timezone.utc
+        assert refreshed.token == "new_token"
+        assert refreshed.expiry > datetime.now(timezone.utc)
+    
+    @pytest.mark.parametrize(
+        "minutes_left,should_refresh",
+        [(10, False), (2, True)],
+        ids=["above_skew", "within_skew"],
+    )
+    def test_refresh_respects_skew(self, minutes_left, should_refresh):
+        """Test tokens are only refreshed once they are within TOKEN_REFRESH_SKEW of expiry."""
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=datetime.now(timezone.utc) + timedelta(minutes=minutes_left),
+        )
+        
+        with patch.object(Credentials, "refresh") as mock_refresh:
+            refresh_access_token(creds)
+        
+        assert mock_refresh.called is should_refresh
+        if should_refresh:
+            # This thread's transport is reused rather than a new Request() per call
+            assert mock_refresh.call_args.args[0] is _refresh_request()
+    
+    async def test_refresh_request_per_thread(self):
+        """Test each thread reuses its own refresh transport instead of sharing one Session."""
+        worker_requests = await asyncio.gather(*(asyncio.to_thread(_refresh_request) for _ in range(2)))
+        
+        assert _refresh_request() is _refresh_request()
+        assert all(r is not _refresh_request() for r in worker_requests)
+    
+    def test_expires_at_is_absolute_after_reload(self, monkeypatch):
+        """Test a stored expiry keeps counting down: once the clock passes it, a refresh is due."""
+        issued_at = datetime.now(timezone.utc)
+        stored_expires_at = issued_at + timedelta(minutes=10)
+        
+        class _Later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return issued_at + timedelta(minutes=11)
+        
+        # Rebuilt from the persisted absolute timestamp, as the API does on each request
+        creds = create_credentials_from_tokens("test_token", "test_refresh", stored_expires_at)
+        assert creds.expiry == stored_expires_at
+        
+        monkeypatch.setattr("backend.app.services.google_drive.datetime", _Later)
+        with patch.object(Credentials, "refresh") as mock_refresh:
+            refresh_access_token(creds)
+        
+        mock_refresh.assert_called_once()
+
+
+class TestGetDriveService:
+    def test_requests_gzip_responses(self):
+        """Test Drive JSON requests ask for gzip (googleapiclient's JsonModel sets both headers)."""
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+        )
+        
+        # Static discovery document: building the service makes no network call
+        request = get_drive_service(creds).files().list(pageSize=1)
+        
+        assert "gzip" in request.headers["accept-encoding"]
+        assert "gzip" in request.headers["user-agent"]
+    
+    def test_discovery_doc_parsed_once(self):
+        """Test services share one parsed discovery document but not the service object."""
+        creds = create_credentials_from_tokens(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+        )
+        _drive_discovery_doc.cache_clear()
+        
+        first = get_drive_service(creds)
+        second = get_drive_service(creds)
+        
+        # httplib2 transports aren't thread-safe, so each call gets its own service
+        assert first is not second
+        assert _drive_discovery_doc.cache_info().misses == 1
+        assert first.files().list(pageSize=1).uri == second.files().list(pageSize=1).uri
 
 
 class TestGetAuthorizationUrl:
+    @pytest.fixture(autouse=True)
+    def _fresh_flow_cache(self):
+        """Start and end each test without a cached flow, so patches of create_oauth_flow apply."""
+        _authorization_flow.cache_clear()
+        yield
+        _authorization_flow.cache_clear()
+    
     def test_get_authorization_url(self):
         """Test getting authorization URL."""
         with patch("backend.app.services.google_drive.create_oauth_flow") as mock_flow:
@@ -120,179 +219,321 @@ class TestGetAuthorizationUrl:
             assert url is not None
             assert isinstance(url, str)
             mock_flow_instance.authorization_url.assert_called_once()
+    
+    def test_oauth_flow_is_cached(self):
+        """Test the flow is built once while every URL still gets its own PKCE challenge."""
+        with patch("backend.app.services.google_drive.create_oauth_flow", wraps=create_oauth_flow) as mock_flow:
+            first = get_authorization_url(state="a")
+            second = get_authorization_url(state="b")
+        
+        mock_flow.assert_called_once()
+        challenges = [parse_qs(urlparse(url).query)["code_challenge"] for url in (first, second)]
+        assert challenges[0] != challenges[1]
+
+
+@pytest.fixture
+def drive_service(monkeypatch) -> Mock:
+    """
+    Wire the Drive helpers to one mocked service with fresh credentials; tests set
+    responses on it, e.g. `drive_service.files.return_value.list.return_value.execute.return_value`.
+    """
+    service = Mock()
+    monkeypatch.setattr(
+        "backend.app.services.google_drive.create_credentials_from_tokens",
+        lambda *args, **kwargs: Mock(expiry=_FRESH_EXPIRY),
+    )
+    monkeypatch.setattr("backend.app.services.google_drive.refresh_access_token", lambda credentials: credentials)
+    monkeypatch.setattr("backend.app.services.google_drive.get_drive_service", lambda credentials: service)
+    return service
 
 
 @pytest.mark.asyncio
 class TestListDriveFiles:
-    async def test_list_drive_files_success(self):
+    async def test_list_drive_files_success(self, drive_service):
         """Test listing drive files successfully."""
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        mock_list = drive_service.files.return_value.list
+        mock_list.return_value.execute.return_value = {
+            "files": [
+                {
+                    "id": "file1",
+                    "name": "test1.pdf",
+                    "mimeType": "application/pdf",
+                    "size": "1024",
+                    "modifiedTime": "2024-01-01T00:00:00Z",
+                    "webViewLink": "https://drive.google.com/file1",
+                }
+            ],
+            "nextPageToken": None,
+        }
         
-        with patch("backend.app.services.google_drive.create_credentials_from_tokens") as mock_create, \
-             patch("backend.app.services.google_drive.refresh_access_token") as mock_refresh, \
-             patch("backend.app.services.google_drive.get_drive_service") as mock_service:
-            
-            mock_creds = Mock()
-            mock_create.return_value = mock_creds
-            mock_refresh.return_value = mock_creds
-            
-            mock_service_instance = Mock()
-            mock_files_list = Mock()
-            mock_files_list.execute.return_value = {
-                "files": [
-                    {
-                        "id": "file1",
-                        "name": "test1.pdf",
-                        "mimeType": "application/pdf",
-                        "size": "1024",
-                        "modifiedTime": "2024-01-01T00:00:00Z",
-                        "webViewLink": "https://drive.google.com/file1",
-                    }
-                ],
-                "nextPageToken": None,
-            }
-            mock_service_instance.files.return_value.list.return_value = mock_files_list
-            mock_service.return_value = mock_service_instance
-            
-            result = await list_drive_files(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=expires_at,
-                page_size=10,
-            )
-            
-            assert "files" in result
-            assert len(result["files"]) == 1
-            assert result["files"][0]["id"] == "file1"
+        result = await list_drive_files(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            page_size=10,
+        )
+        
+        assert "files" in result
+        assert len(result["files"]) == 1
+        assert result["files"][0]["id"] == "file1"
+        # Partial response: only the fields the API layer reads
+        mock_list.assert_called_once_with(
+            pageSize=10,
+            fields="nextPageToken, files(id, name, mimeType, size, modifiedTime, webViewLink)",
+            q="trashed=false and 'root' in parents",
+        )
     
-    async def test_list_drive_files_with_pagination(self):
+    async def test_list_drive_files_with_pagination(self, drive_service):
         """Test listing drive files with pagination."""
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        drive_service.files.return_value.list.return_value.execute.return_value = {
+            "files": [],
+            "nextPageToken": "next_page_token_123",
+        }
         
-        with patch("backend.app.services.google_drive.create_credentials_from_tokens") as mock_create, \
-             patch("backend.app.services.google_drive.refresh_access_token") as mock_refresh, \
-             patch("backend.app.services.google_drive.get_drive_service") as mock_service:
-            
-            mock_creds = Mock()
-            mock_create.return_value = mock_creds
-            mock_refresh.return_value = mock_creds
-            
-            mock_service_instance = Mock()
-            mock_files_list = Mock()
-            mock_files_list.execute.return_value = {
-                "files": [],
-                "nextPageToken": "next_page_token_123",
-            }
-            mock_service_instance.files.return_value.list.return_value = mock_files_list
-            mock_service.return_value = mock_service_instance
-            
-            result = await list_drive_files(
-                access_token="test_token",
-                refresh_token="test_refresh",
-                expires_at=expires_at,
-                page_size=10,
-                page_token="prev_token",
-            )
-            
-            assert result["next_page_token"] == "next_page_token_123"
+        result = await list_drive_files(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            page_size=10,
+            page_token="prev_token",
+        )
+        
+        assert result["next_page_token"] == "next_page_token_123"
+    
+    async def test_list_drive_files_query(self, drive_service):
+        """Test the q filter combines trash, parent folder and user query."""
+        mock_list = drive_service.files.return_value.list
+        mock_list.return_value.execute.return_value = {"files": []}
+        
+        await list_drive_files(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            query="mimeType='application/pdf'",
+            parent_folder_id="folder1",
+        )
+        
+        params = mock_list.call_args.kwargs
+        assert params["q"] == "trashed=false and 'folder1' in parents and mimeType='application/pdf'"
+        assert params["fields"].startswith("nextPageToken")
+    
+    @pytest.mark.parametrize(
+        "seconds_left,waits",
+        [(30, True), (180, False)],
+        ids=["expiring_waits", "stale_in_background"],
+    )
+    async def test_list_drive_files_concurrent_refresh(self, seconds_left, waits, monkeypatch):
+        """Test concurrent calls with an expiring token share a single refresh."""
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=seconds_left)
+        refresh_token = "test_refresh"
+        refreshed = Mock(expiry=_FRESH_EXPIRY, token="new_token", refresh_token=refresh_token)
+        # Real create_credentials_from_tokens (the expiry drives the refresh), so not drive_service
+        mock_refresh = Mock(return_value=refreshed)
+        mock_service = Mock()
+        mock_service.return_value.files.return_value.list.return_value.execute.return_value = {"files": []}
+        monkeypatch.setattr("backend.app.services.google_drive.refresh_access_token", mock_refresh)
+        monkeypatch.setattr("backend.app.services.google_drive.get_drive_service", mock_service)
+        
+        await asyncio.gather(*(
+            list_drive_files(access_token="old_token", refresh_token=refresh_token, expires_at=expires_at)
+            for _ in range(2)
+        ))
+        # Let a background refresh finish before the patches are undone
+        await asyncio.gather(*_refresh_tasks.values())
+        
+        mock_refresh.assert_called_once()
+        used_tokens = {c.args[0].token for c in mock_service.call_args_list}
+        assert used_tokens == ({"new_token"} if waits else {"old_token"})
+
+
+@pytest.mark.asyncio
+class TestGetFreshCredentials:
+    async def test_cached_credentials_without_expiry(self, monkeypatch):
+        """Test a cached refresh result with no expiry is skipped and aged out, not compared."""
+        monkeypatch.setitem(_refreshed_credentials, "test_refresh", Mock(expiry=None))
+        creds = Mock(refresh_token="test_refresh", expiry=_FRESH_EXPIRY)
+        
+        assert await get_fresh_credentials(creds) is creds
+        
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(Mock(expiry=_FRESH_EXPIRY))
+        _store_refreshed("other_refresh", done)
+        
+        assert "test_refresh" not in _refreshed_credentials
+    
+    async def test_refresh_without_expiry_not_cached(self):
+        """Test a refresh result with no expiry is not cached."""
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(Mock(expiry=None))
+        
+        _store_refreshed("test_refresh", done)
+        
+        assert "test_refresh" not in _refreshed_credentials
+
+
+def _fake_downloader(*chunks):
+    """Builds a MediaIoBaseDownload replacement that writes the given chunks."""
+    def factory(fd, request, chunksize):
+        remaining = list(chunks)
+        downloader = Mock()
+        
+        def next_chunk():
+            fd.write(remaining.pop(0))
+            return None, not remaining
+        
+        downloader.next_chunk.side_effect = next_chunk
+        return downloader
+    return factory
 
 
 @pytest.mark.asyncio
 class TestDownloadDriveFile:
-    async def test_download_drive_file_success(self):
+    async def test_download_drive_file_success(self, drive_service, monkeypatch):
         """Test downloading a file successfully."""
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        monkeypatch.setattr(
+            "backend.app.services.google_drive.MediaIoBaseDownload", _fake_downloader(b"file content")
+        )
         
-        with patch("backend.app.services.google_drive.create_credentials_from_tokens") as mock_create, \
-             patch("backend.app.services.google_drive.refresh_access_token") as mock_refresh, \
-             patch("backend.app.services.google_drive.get_drive_service") as mock_service:
-            
-            mock_creds = Mock()
-            mock_create.return_value = mock_creds
-            mock_refresh.return_value = mock_creds
-            
-            mock_service_instance = Mock()
-            mock_get_media = Mock()
-            mock_get_media.execute.return_value = b"file content"
-            mock_service_instance.files.return_value.get_media.return_value = mock_get_media
-            mock_service.return_value = mock_service_instance
-            
-            content = await download_drive_file(
+        content = await download_drive_file(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            file_id="file123",
+        )
+        
+        assert content == b"file content"
+    
+    async def test_download_drive_file_chunked(self, drive_service):
+        """Test multi-chunk downloads are streamed chunk by chunk and joined by download_drive_file."""
+        with patch("backend.app.services.google_drive.MediaIoBaseDownload") as mock_downloader:
+            mock_downloader.side_effect = _fake_downloader(b"first ", b"second")
+            chunks = [
+                chunk
+                async for chunk in iter_drive_file("test_token", "test_refresh", _FRESH_EXPIRY, "file123", chunk_size=6)
+            ]
+            
+            mock_downloader.side_effect = _fake_downloader(b"first ", b"second")
+            content = await download_drive_file("test_token", "test_refresh", _FRESH_EXPIRY, "file123")
+        
+        # One buffer is reused, so each chunk comes out on its own
+        assert chunks == [b"first ", b"second"]
+        assert mock_downloader.call_args_list[0].kwargs["chunksize"] == 6
+        assert content == b"first second"
+    
+    async def test_download_drive_file_error(self, drive_service, monkeypatch):
+        """Test downloading a file with error."""
+        mock_resp = Mock()
+        mock_resp.status = 404
+        mock_error = HttpError(mock_resp, b"Not found")
+        
+        downloader = Mock()
+        downloader.next_chunk.side_effect = mock_error
+        monkeypatch.setattr(
+            "backend.app.services.google_drive.MediaIoBaseDownload", lambda *args, **kwargs: downloader
+        )
+        
+        with pytest.raises(DriveAPIError) as exc_info:
+            await download_drive_file(
                 access_token="test_token",
                 refresh_token="test_refresh",
-                expires_at=expires_at,
+                expires_at=_FRESH_EXPIRY,
                 file_id="file123",
             )
-            
-            assert content == b"file content"
-    
-    async def test_download_drive_file_error(self):
-        """Test downloading a file with error."""
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
         
-        with patch("backend.app.services.google_drive.create_credentials_from_tokens") as mock_create, \
-             patch("backend.app.services.google_drive.refresh_access_token") as mock_refresh, \
-             patch("backend.app.services.google_drive.get_drive_service") as mock_service:
-            
-            from googleapiclient.errors import HttpError
-            
-            mock_creds = Mock()
-            mock_create.return_value = mock_creds
-            mock_refresh.return_value = mock_creds
-            
-            mock_service_instance = Mock()
-            mock_get_media = Mock()
-            mock_resp = Mock()
-            mock_resp.status = 404
-            mock_error = HttpError(mock_resp, b"Not found")
-            mock_get_media.execute.side_effect = mock_error
-            mock_service_instance.files.return_value.get_media.return_value = mock_get_media
-            mock_service.return_value = mock_service_instance
-            
-            with pytest.raises(Exception) as exc_info:
-                await download_drive_file(
-                    access_token="test_token",
-                    refresh_token="test_refresh",
-                    expires_at=expires_at,
-                    file_id="file123",
-                )
-            
-            assert "Error downloading file from Google Drive" in str(exc_info.value)
+        assert "Error downloading file from Google Drive" in str(exc_info.value)
+        assert exc_info.value.status_code == 404
+        assert exc_info.value.__cause__ is mock_error
 
 
 @pytest.mark.asyncio
 class TestGetFileMetadata:
-    async def test_get_file_metadata_success(self):
+    async def test_get_file_metadata_success(self, drive_service):
         """Test getting file metadata successfully."""
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        mock_get = drive_service.files.return_value.get
+        mock_get.return_value.execute.return_value = {
+            "id": "file123",
+            "name": "test.pdf",
+            "mimeType": "application/pdf",
+            "size": "1024",
+            "modifiedTime": "2024-01-01T00:00:00Z",
+        }
         
-        with patch("backend.app.services.google_drive.create_credentials_from_tokens") as mock_create, \
-             patch("backend.app.services.google_drive.refresh_access_token") as mock_refresh, \
-             patch("backend.app.services.google_drive.get_drive_service") as mock_service:
-            
-            mock_creds = Mock()
-            mock_create.return_value = mock_creds
-            mock_refresh.return_value = mock_creds
-            
-            mock_service_instance = Mock()
-            mock_get = Mock()
-            mock_get.execute.return_value = {
-                "id": "file123",
-                "name": "test.pdf",
-                "mimeType": "application/pdf",
-                "size": "1024",
-                "modifiedTime": "2024-01-01T00:00:00Z",
-            }
-            mock_service_instance.files.return_value.get.return_value = mock_get
-            mock_service.return_value = mock_service_instance
-            
-            metadata = await get_file_metadata(
+        metadata = await get_file_metadata(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            file_id="file123",
+        )
+        
+        assert metadata["id"] == "file123"
+        assert metadata["name"] == "test.pdf"
+        mock_get.assert_called_once_with(
+            fileId="file123",
+            fields="id, name, mimeType, size, modifiedTime, createdTime, webViewLink, owners",
+        )
+    
+    async def test_get_file_metadata_quota_error(self, drive_service):
+        """Test a Drive error keeps its status, reason and message text."""
+        mock_resp = Mock()
+        mock_resp.status = 403
+        body = (
+            b'{"error": {"code": 403, "message": "The user\'s Drive storage quota has been exceeded.",'
+            b' "errors": [{"domain": "usageLimits", "reason": "storageQuotaExceeded"}]}}'
+        )
+        quota_error = HttpError(mock_resp, body)
+        drive_service.files.return_value.get.return_value.execute.side_effect = quota_error
+        
+        with pytest.raises(DriveAPIError) as exc_info:
+            await get_file_metadata(
                 access_token="test_token",
                 refresh_token="test_refresh",
-                expires_at=expires_at,
+                expires_at=_FRESH_EXPIRY,
                 file_id="file123",
             )
-            
-            assert metadata["id"] == "file123"
-            assert metadata["name"] == "test.pdf"
-
+        
+        assert exc_info.value.status_code == 403
+        assert exc_info.value.reason == "storageQuotaExceeded"
+        assert exc_info.value.quota_exceeded
+        assert "storage quota has been exceeded" in str(exc_info.value)
+        assert exc_info.value.__cause__ is quota_error
+    
+    async def test_get_files_metadata_batches(self, drive_service):
+        """Test batched metadata lookup splits into 100-call batches and keeps per-file errors."""
+        file_ids = [f"file{i}" for i in range(101)]
+        
+        mock_resp = Mock()
+        mock_resp.status = 404
+        not_found = HttpError(mock_resp, b"Not found")
+        batches = []
+        
+        def new_batch(callback):
+            batch = Mock()
+            batch.requests = []
+            batch.add.side_effect = lambda request, request_id: batch.requests.append(request_id)
+            
+            def execute():
+                for request_id in batch.requests:
+                    if request_id == "file7":
+                        callback(request_id, None, not_found)
+                    else:
+                        callback(request_id, {"id": request_id}, None)
+            
+            batch.execute.side_effect = execute
+            batches.append(batch)
+            return batch
+        
+        drive_service.new_batch_http_request.side_effect = new_batch
+        
+        results = await get_files_metadata(
+            access_token="test_token",
+            refresh_token="test_refresh",
+            expires_at=_FRESH_EXPIRY,
+            file_ids=file_ids,
+        )
+        
+        assert [len(batch.requests) for batch in batches] == [100, 1]
+        assert results["file0"] == {"id": "file0"}
+        assert results["file100"] == {"id": "file100"}
+        assert isinstance(results["file7"], DriveAPIError)
+        assert results["file7"].status_code == 404
+        assert results["file7"].__cause__ is not_found
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import base64
 import time
 import pytest
 
@@ -9,7 +10,9 @@ from backend.app.security import (
     hash_password,
     verify_password,
 )
-from backend.core.config import settings
+from backend.core.config import DEFAULT_BCRYPT_ROUNDS, settings
+
+_PASSWORD = "testpassword123"
 
 
 class TestSessionTokens:
@@ -38,18 +41,17 @@ class TestSessionTokens:
         payload = verify_session_token(invalid_token)
         assert payload is None
     
-    def test_verify_expired_token(self):
+    def test_verify_expired_token(self, monkeypatch):
         """Test verifying an expired token."""
-        from unittest.mock import patch
-        
         user_id = "123e4567-e89b-12d3-a456-426614174000"
         # Create token with 0 TTL (expires immediately)
         token = create_session_token(user_id, ttl_minutes=0)
         
-        # Mock time.time() to return a time after expiration
-        with patch("backend.app.security.time.time", return_value=int(time.time()) + 100):
-            payload = verify_session_token(token)
-            assert payload is None
+        # Move time.time() past the expiration
+        expired_at = int(time.time()) + 100
+        monkeypatch.setattr("backend.app.security.time.time", lambda: expired_at)
+        
+        assert verify_session_token(token) is None
     
     def test_verify_tampered_token(self):
         """Test verifying a tampered token."""
@@ -61,6 +63,33 @@ class TestSessionTokens:
         payload = verify_session_token(tampered_token)
         assert payload is None
     
+    def test_signature_length_32_bytes(self):
+        """Test the keyed BLAKE2b signature is 32 bytes."""
+        token = create_session_token("123e4567-e89b-12d3-a456-426614174000")
+        sig = token.split(".", 1)[1]
+        
+        assert len(base64.urlsafe_b64decode(sig + "=" * (-len(sig) % 4))) == 32
+    
+    def test_token_with_long_secret_key(self, monkeypatch):
+        """Test secrets longer than BLAKE2b's 64-byte key limit still sign and verify."""
+        monkeypatch.setattr(settings, "SECRET_KEY", "k" * 100)
+        token = create_session_token("123e4567-e89b-12d3-a456-426614174000")
+        
+        assert verify_session_token(token) is not None
+    
+    def test_token_has_no_whitespace(self):
+        """Test the payload is serialized compactly."""
+        token = create_session_token("123e4567-e89b-12d3-a456-426614174000")
+        payload_b64 = token.split(".", 1)[0]
+        
+        assert b" " not in base64.urlsafe_b64decode(payload_b64 + "=" * (-len(payload_b64) % 4))
+    
+    def test_verify_token_with_junk_in_signature(self):
+        """Test a signature with non-base64url characters is rejected, not stripped."""
+        token = create_session_token("123e4567-e89b-12d3-a456-426614174000")
+        
+        assert verify_session_token(token + "!") is None
+    
     def test_token_with_custom_ttl(self):
         """Test creating token with custom TTL."""
         user_id = "123e4567-e89b-12d3-a456-426614174000"
@@ -74,31 +103,34 @@ class TestSessionTokens:
         assert abs(exp - expected_exp) < 5  # Allow 5 second tolerance
 
 
+@pytest.fixture(scope="module")
+def hashed_test_password() -> str:
+    """One real bcrypt hash of _PASSWORD, shared by the tests that only read it."""
+    return hash_password(_PASSWORD)
+
+
 class TestPasswordHashing:
-    def test_hash_password(self):
+    def test_password_hashing_is_bcrypt(self, hashed_test_password):
+        """Test the real helpers use bcrypt (conftest stubs them for other tests)."""
+        assert hashed_test_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    
+    def test_default_bcrypt_cost(self):
+        """Test the default cost stays >= 12, whatever BCRYPT_ROUNDS this environment sets."""
+        assert DEFAULT_BCRYPT_ROUNDS >= 12
+    
+    def test_hash_password(self, hashed_test_password):
         """Test password hashing."""
-        password = "testpassword123"
-        hashed = hash_password(password)
-        
-        assert hashed is not None
-        assert isinstance(hashed, str)
-        assert hashed != password
-        assert len(hashed) > 0
+        assert isinstance(hashed_test_password, str)
+        assert hashed_test_password != _PASSWORD
+        assert len(hashed_test_password) > 0
     
-    def test_verify_correct_password(self):
+    def test_verify_correct_password(self, hashed_test_password):
         """Test verifying correct password."""
-        password = "testpassword123"
-        hashed = hash_password(password)
-        
-        assert verify_password(password, hashed) is True
+        assert verify_password(_PASSWORD, hashed_test_password) is True
     
-    def test_verify_incorrect_password(self):
+    def test_verify_incorrect_password(self, hashed_test_password):
         """Test verifying incorrect password."""
-        password = "testpassword123"
-        wrong_password = "wrongpassword"
-        hashed = hash_password(password)
-        
-        assert verify_password(wrong_password, hashed) is False
+        assert verify_password("wrongpassword", hashed_test_password) is False
     
     def test_hash_different_passwords_different_hashes(self):
         """Test that different passwords produce different hashes."""
@@ -112,7 +144,7 @@ class TestPasswordHashing:
     
     def test_hash_same_password_different_hashes(self):
         """Test that same password produces different hashes (due to salt)."""
-        password = "testpassword123"
+        password = _PASSWORD
         
         hashed1 = hash_password(password)
         hashed2 = hash_password(password)
@@ -123,16 +155,25 @@ class TestPasswordHashing:
         assert verify_password(password, hashed1) is True
         assert verify_password(password, hashed2) is True
     
-    def test_password_72_byte_limit(self):
-        """Test that passwords longer than 72 bytes are truncated."""
-        # Create a password longer than 72 bytes
+    def test_password_72_byte_limit(self, monkeypatch):
+        """Test passwords longer than 72 bytes are truncated before reaching bcrypt."""
+        seen = []
+        
+        def fake_hashpw(password, salt):
+            seen.append(password)
+            return b"$2b$04$" + b"x" * 53
+        
+        def fake_checkpw(password, hashed):
+            seen.append(password)
+            return True
+        
+        # No real bcrypt: only the bytes handed to it matter here
+        monkeypatch.setattr("backend.app.security.bcrypt.hashpw", fake_hashpw)
+        monkeypatch.setattr("backend.app.security.bcrypt.checkpw", fake_checkpw)
         long_password = "a" * 100
-        hashed = hash_password(long_password)
         
-        # Should still hash successfully
-        assert hashed is not None
-        # Should verify correctly (truncated version)
-        assert verify_password(long_password, hashed) is True
+        assert verify_password(long_password, hash_password(long_password)) is True
+        assert seen == [b"a" * 72, b"a" * 72]
     
     def test_verify_password_with_invalid_hash(self):
         """Test verifying password with invalid hash."""